@@ -1,10 +1,17 @@
-from django.contrib import admin
+import phonenumbers
+from django.contrib import admin, messages
+from django.db import connection
+from django.db.models import Q
 from django.urls import reverse
-from django.templatetags.static import static
 from django.utils.html import format_html
 from django.shortcuts import redirect
 from django.utils.http import url_has_allowed_host_and_scheme
 
+from .claims import claim_orders
+from .images import get_image_variant_url
+from .paginators import EstimatedCountPaginator
+from .search import search_products
+from .models import Banner
 from .models import Product
 from .models import ProductCategory
 from .models import Restaurant
@@ -53,8 +60,6 @@ class ProductAdmin(admin.ModelAdmin):
         'category',
     ]
     search_fields = [
-        # FIXME SQLite can not convert letter case for cyrillic words properly, so search will be buggy.
-        # Migration to PostgreSQL is necessary
         'name',
         'category__name',
     ]
@@ -87,24 +92,31 @@ class ProductAdmin(admin.ModelAdmin):
         'get_image_preview',
     ]
 
+    def get_search_results(self, request, queryset, search_term):
+        # SQLite не умеет без учёта регистра сравнивать кириллицу
+        if connection.vendor != 'sqlite' or not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        return search_products(queryset, search_term), False
+
     class Media:
         css = {
             "all": (
-                static("admin/foodcartapp.css")
+                "admin/foodcartapp.css",
             )
         }
 
     def get_image_preview(self, obj):
         if not obj.image:
             return 'выберите картинку'
-        return format_html('<img src="{url}" height="200"/>', url=obj.image.url)
+        return format_html('<img src="{url}" height="200"/>',
+                           url=get_image_variant_url(obj, 'card'))
     get_image_preview.short_description = 'превью'
 
     def get_image_list_preview(self, obj):
         if not obj.image or not obj.id:
             return 'нет картинки'
         edit_url = reverse('admin:foodcartapp_product_change', args=(obj.id,))
-        return format_html('<a href="{edit_url}"><img src="{src}" height="50"/></a>', edit_url=edit_url, src=obj.image.url)
+        return format_html('<a href="{edit_url}"><img src="{src}" height="50"/></a>', edit_url=edit_url, src=get_image_variant_url(obj, 'thumbnail'))
     get_image_list_preview.short_description = 'превью'
 
 
@@ -113,6 +125,47 @@ class ProductAdmin(admin.ModelAdmin):
     pass
 
 
+@admin.register(Banner)
+class BannerAdmin(admin.ModelAdmin):
+    list_display = [
+        'get_image_list_preview',
+        'title',
+        'order',
+        'active_from',
+        'active_until',
+    ]
+    list_display_links = [
+        'title',
+    ]
+    list_editable = [
+        'order',
+    ]
+    fields = [
+        'title',
+        'text',
+        'image',
+        'get_image_preview',
+        'order',
+        'active_from',
+        'active_until',
+    ]
+    readonly_fields = [
+        'get_image_preview',
+    ]
+
+    def get_image_preview(self, obj):
+        if not obj.image:
+            return 'выберите картинку'
+        return format_html('<img src="{url}" height="200"/>', url=obj.image.url)
+    get_image_preview.short_description = 'превью'
+
+    def get_image_list_preview(self, obj):
+        if not obj.image:
+            return 'нет картинки'
+        return format_html('<img src="{src}" height="50"/>', src=obj.image.url)
+    get_image_list_preview.short_description = 'превью'
+
+
 class OrderProductInline(admin.TabularInline):
     model = OrderProduct
     extra = 0
@@ -126,12 +179,81 @@ class OrderAdmin(admin.ModelAdmin):
     inlines = [
         OrderProductInline
     ]
-    search_fields = ['address']
+    list_display = [
+        'id',
+        'registrated_at',
+        'order_status',
+        'payment_method',
+        'total_price',
+        'restaurant',
+        'firstname',
+        'lastname',
+        'phonenumber',
+    ]
+    list_select_related = ['restaurant']
+    list_filter = [
+        'order_status',
+        'payment_method',
+        'registrated_at',
+        'restaurant',
+    ]
+    # Ищем только по полям с индексом: номеру заказа и телефону
+    search_fields = ['=id', '=phonenumber']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    readonly_fields = ['total_price', 'auto_assigned', 'claimed_by', 'claimed_at']
+    actions = ['claim_selected_orders']
+
+    def has_change_permission(self, request, obj=None):
+        # Заказ, который взял в работу другой менеджер, можно только смотреть
+        if obj is not None and obj.get_active_claim() not in (None, request.user.id):
+            return False
+        return super().has_change_permission(request, obj)
+
+    def save_model(self, request, obj, form, change):
+        if 'restaurant' in form.changed_data:
+            obj.auto_assigned = False
+        super().save_model(request, obj, form, change)
+
+    def claim_selected_orders(self, request, queryset):
+        order_ids = list(queryset.values_list('id', flat=True))
+        claimed_ids = claim_orders(request.user, len(order_ids),
+                                   order_ids=order_ids)
+        self.message_user(request, f'Взято в работу заказов: {len(claimed_ids)}')
+        if len(claimed_ids) < len(order_ids):
+            self.message_user(
+                request,
+                f'Уже в работе у других менеджеров или обработано: '
+                f'{len(order_ids) - len(claimed_ids)}',
+                messages.WARNING,
+            )
+    claim_selected_orders.short_description = 'Взять в работу'
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+
+        conditions = Q()
+        if search_term.isdigit():
+            conditions |= Q(id=int(search_term))
+        try:
+            phonenumber = phonenumbers.parse(search_term, 'RU')
+        except phonenumbers.NumberParseException:
+            phonenumber = None
+        if phonenumber is not None and phonenumbers.is_possible_number(phonenumber):
+            conditions |= Q(phonenumber=phonenumbers.format_number(
+                phonenumber, phonenumbers.PhoneNumberFormat.E164
+            ))
+        if not conditions:
+            return queryset.none(), False
+        return queryset.filter(conditions), False
 
     def response_change(self, request, obj):
         res = super().response_change(request, obj)
-        if url_has_allowed_host_and_scheme(request.GET['next'], None):
-            return redirect(request.GET['next'])
+        next_url = request.GET.get('next')
+        if next_url and url_has_allowed_host_and_scheme(next_url, None):
+            return redirect(next_url)
         return res
 
 
@@ -0,0 +1,59 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.exceptions import APIException
+
+from .banners import get_banners_payload, make_banners_response
+from .idempotency import get_idempotency_key
+from .views import get_products_content, place_order
+from .views import get_catalog_etag, get_catalog_last_modified
+from .views import get_catalog_version
+
+
+async def banners_list_api(request):
+    payload = await sync_to_async(get_banners_payload)()
+    return make_banners_response(request, payload)
+
+
+async def product_list_api(request):
+    catalog_version = await sync_to_async(get_catalog_version)(request)
+    etag = get_catalog_etag(request)
+    last_modified = int(get_catalog_last_modified(request).timestamp())
+
+    response = get_conditional_response(request, etag=etag,
+                                        last_modified=last_modified)
+    if response is None:
+        content = await sync_to_async(get_products_content)(catalog_version)
+        response = HttpResponse(content, content_type='application/json')
+        patch_cache_control(response, no_cache=True)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+async def register_order(request):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        order_data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'detail': 'JSON parse error'}, status=400)
+
+    try:
+        idempotency_key = get_idempotency_key(request)
+        order = await sync_to_async(place_order)(order_data, idempotency_key)
+    except APIException as error:
+        detail = error.detail
+        if not isinstance(detail, (list, dict)):
+            detail = {'detail': detail}
+        return JsonResponse(detail, status=error.status_code, safe=False,
+                            json_dumps_params={'ensure_ascii': False})
+    return JsonResponse(order, json_dumps_params={'ensure_ascii': False})
+
+# Как и у DRF-версии, заказ оформляется без сессии, CSRF-токен не нужен.
+# csrf_exempt в Django 3.1 не умеет оборачивать async-функции
+register_order.csrf_exempt = True
@@ -0,0 +1,109 @@
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import RestaurantMenuItem
+from .versions import CATALOG, MENU, bump_version, get_version
+
+
+_cached_availability = None
+
+
+class RestaurantAvailability:
+    """Индекс «товар → рестораны, где он в продаже».
+
+    Для каждого товара хранится битовая маска ресторанов, поэтому
+    рестораны, способные собрать заказ целиком, ищутся побитовым И.
+    """
+
+    def __init__(self, menu_items):
+        self.restaurant_ids = []
+        self._positions = {}
+        self._products = {}
+        for product_id, restaurant_id in menu_items:
+            position = self._positions.get(restaurant_id)
+            if position is None:
+                position = len(self.restaurant_ids)
+                self._positions[restaurant_id] = position
+                self.restaurant_ids.append(restaurant_id)
+            self._products[product_id] = (
+                self._products.get(product_id, 0) | 1 << position
+            )
+
+    @classmethod
+    def build(cls):
+        menu_items = (
+            RestaurantMenuItem.objects
+                .available()
+                .values_list('product_id', 'restaurant_id')
+        )
+        return cls(menu_items)
+
+    def get_mask(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return 0
+        mask = -1
+        for product_id in product_ids:
+            mask &= self._products.get(product_id, 0)
+            if not mask:
+                break
+        return mask
+
+    def get_restaurant_ids(self, product_ids):
+        mask = self.get_mask(product_ids)
+        restaurant_ids = []
+        position = 0
+        while mask:
+            if mask & 1:
+                restaurant_ids.append(self.restaurant_ids[position])
+            mask >>= 1
+            position += 1
+        return restaurant_ids
+
+    def is_available(self, restaurant_id, product_id):
+        position = self._positions.get(restaurant_id)
+        if position is None:
+            return False
+        return bool(self._products.get(product_id, 0) >> position & 1)
+
+
+def get_availability():
+    global _cached_availability
+    version = get_version(MENU)
+    if _cached_availability is None or _cached_availability[0] != version:
+        _cached_availability = (version, RestaurantAvailability.build())
+    return _cached_availability[1]
+
+
+def set_availability(cells, availability):
+    """Включает или выключает товары в меню ресторанов.
+
+    cells — пары (id ресторана, id товара). Существующие пункты меню
+    меняются одним UPDATE, недостающие создаются, только если товар
+    включают в продажу.
+    """
+    cells = set(cells)
+    if not cells:
+        return
+    with transaction.atomic():
+        updated_count = (
+            RestaurantMenuItem.objects
+                .filter(reduce(or_, (
+                    Q(restaurant_id=restaurant_id, product_id=product_id)
+                    for restaurant_id, product_id in cells
+                )))
+                .update(availability=availability)
+        )
+        if availability and updated_count < len(cells):
+            RestaurantMenuItem.objects.bulk_create([
+                RestaurantMenuItem(restaurant_id=restaurant_id,
+                                   product_id=product_id,
+                                   availability=True)
+                for restaurant_id, product_id in cells
+            ], ignore_conflicts=True)
+    # update() и bulk_create() не шлют сигналы, поэтому сбрасываем кеши сами
+    bump_version(MENU)
+    bump_version(CATALOG)
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min, Q
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from star_burger.storage import brotli, compress_brotli, compress_gzip
+from .models import Banner
+from .versions import BANNERS, get_version
+
+
+ACCEPTS_ENCODING = {
+    'br': re.compile(r'\bbr\b'),
+    'gzip': re.compile(r'\bgzip\b'),
+}
+
+
+def dump_banners(banners):
+    return [
+        {
+            'title': banner.title,
+            'src': banner.image.url,
+            'text': banner.text,
+        }
+        for banner in banners
+    ]
+
+
+def get_next_change(now):
+    # Набор активных баннеров меняется сам, когда начинается или
+    # заканчивается чьё-то окно показа
+    changes = Banner.objects.aggregate(
+        next_from=Min('active_from', filter=Q(active_from__gt=now)),
+        next_until=Min('active_until', filter=Q(active_until__gt=now)),
+    )
+    changes = [change for change in changes.values() if change is not None]
+    return min(changes) if changes else None
+
+
+def build_banners_payload():
+    now = timezone.now()
+    content = json.dumps(dump_banners(Banner.objects.active(now)),
+                         ensure_ascii=False, indent=4).encode()
+    encodings = {
+        'identity': content,
+        'gzip': compress_gzip(content),
+    }
+    if brotli is not None:
+        encodings['br'] = compress_brotli(content)
+
+    timeout = settings.CATALOG_CACHE_TIMEOUT
+    next_change = get_next_change(now)
+    if next_change is not None:
+        timeout = min(timeout, (next_change - now).total_seconds())
+    payload = {
+        'etag': f'W/"banners-{hashlib.md5(content).hexdigest()}"',
+        'content': encodings,
+    }
+    return payload, max(timeout, 1)
+
+
+def get_banners_payload():
+    """Возвращает готовый JSON баннеров: как есть, в gzip и в brotli.
+
+    Payload хранится в кеше до изменения баннеров в админке или до
+    начала или конца ближайшего окна показа, поэтому запрос к API
+    не ходит в базу.
+    """
+    cache_key = f'banners_list_api:{get_version(BANNERS)}'
+    payload = cache.get(cache_key)
+    if payload is None:
+        payload, timeout = build_banners_payload()
+        cache.set(cache_key, payload, timeout=timeout)
+    return payload
+
+
+def get_accepted_encoding(request, encodings):
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for encoding, pattern in ACCEPTS_ENCODING.items():
+        if encoding in encodings and pattern.search(accept_encoding):
+            return encoding
+    return 'identity'
+
+
+def make_banners_response(request, payload):
+    response = get_conditional_response(request, etag=payload['etag'])
+    if response is None:
+        encoding = get_accepted_encoding(request, payload['content'])
+        response = HttpResponse(payload['content'][encoding],
+                                content_type='application/json')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+        patch_cache_control(response, no_cache=True)
+
+    response['ETag'] = payload['etag']
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -0,0 +1,39 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Order
+
+
+def claim_orders(manager, count, order_ids=None):
+    """Закрепляет за менеджером до count самых старых свободных заказов.
+
+    order_ids ограничивает выбор этими заказами. На PostgreSQL заказы,
+    которые прямо сейчас берёт другой менеджер, пропускаются через
+    SKIP LOCKED, а не ждут его транзакцию. Возвращает id закреплённых
+    заказов.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        orders = Order.objects.claimable(now).order_by('registrated_at', 'id')
+        if order_ids is not None:
+            orders = orders.filter(id__in=order_ids)
+        if connection.features.has_select_for_update_skip_locked:
+            orders = orders.select_for_update(skip_locked=True)
+        order_ids = list(orders.values_list('id', flat=True)[:count])
+
+        # Без блокировок строк (SQLite) заказ мог уйти другому менеджеру
+        # между выборкой и обновлением, поэтому условие проверяется ещё раз
+        Order.objects.claimable(now).filter(id__in=order_ids).update(
+            claimed_by=manager, claimed_at=now,
+        )
+        return list(
+            Order.objects
+                .filter(id__in=order_ids, claimed_by=manager, claimed_at=now)
+                .values_list('id', flat=True)
+        )
+
+
+def release_orders(manager):
+    return Order.objects.claimed_by_manager(manager).update(
+        claimed_by=None, claimed_at=None,
+    )
@@ -0,0 +1,158 @@
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from place.models import Place
+from .availability import get_availability
+from .locations import get_restaurant_index
+from .models import Order, OrderProduct
+from .versions import MENU, RESTAURANT_LOCATIONS, get_version
+
+
+_skipped_orders = None
+
+
+def get_restaurant_loads():
+    open_orders = (
+        Order.objects
+            .in_progress()
+            .values('restaurant')
+            .annotate(orders_count=Count('id'))
+            .values_list('restaurant', 'orders_count')
+    )
+    return Counter(dict(open_orders))
+
+
+def assign_restaurants(candidates, loads, load_penalty):
+    """Жадно выбирает ресторан для каждого заказа.
+
+    candidates — {id заказа: [(id ресторана, расстояние в км), ...]}.
+    Цена ресторана — расстояние плюс load_penalty км за каждый его
+    открытый заказ. Первыми распределяются заказы с наименьшим выбором
+    ресторанов, чтобы их единственные варианты не заняли другие заказы.
+    Сам loads не меняется: заказ нагружает ресторан, только когда
+    назначение сохранено.
+    """
+    loads = Counter(loads)
+    assignments = {}
+    for order_id, order_candidates in sorted(
+            candidates.items(), key=lambda item: (len(item[1]), item[0])):
+        if not order_candidates:
+            continue
+        restaurant_id, _ = min(
+            order_candidates,
+            key=lambda candidate: (
+                candidate[1] + load_penalty * loads[candidate[0]]
+            ),
+        )
+        assignments[order_id] = restaurant_id
+        loads[restaurant_id] += 1
+    return assignments
+
+
+def save_assignments(assignments):
+    """Сохраняет назначения и возвращает те из них, что сохранились.
+
+    Пока шёл расчёт, менеджер мог выбрать ресторан сам, такие заказы
+    остаются с его рестораном.
+    """
+    order_ids_by_restaurant = defaultdict(list)
+    for order_id, restaurant_id in assignments.items():
+        order_ids_by_restaurant[restaurant_id].append(order_id)
+
+    with transaction.atomic():
+        for restaurant_id, order_ids in order_ids_by_restaurant.items():
+            Order.objects.filter(
+                id__in=order_ids, restaurant__isnull=True,
+            ).update(restaurant=restaurant_id, auto_assigned=True)
+        saved_orders = (
+            Order.objects
+                .filter(id__in=list(assignments), auto_assigned=True)
+                .values_list('id', 'restaurant_id')
+        )
+        return {
+            order_id: restaurant_id for order_id, restaurant_id in saved_orders
+            if assignments[order_id] == restaurant_id
+        }
+
+
+def get_skipped_order_ids():
+    # Заказ, который не собрал ни один ресторан, незачем пересматривать,
+    # пока не изменятся меню или адреса ресторанов
+    global _skipped_orders
+    versions = (get_version(MENU), get_version(RESTAURANT_LOCATIONS))
+    if _skipped_orders is None or _skipped_orders[0] != versions:
+        _skipped_orders = (versions, set())
+    return _skipped_orders[1]
+
+
+def get_candidates(orders, restaurant_index, availability):
+    product_ids = defaultdict(list)
+    for order_id, product_id in (
+            OrderProduct.objects
+                .filter(order__in=[order.id for order in orders])
+                .values_list('order_id', 'product_id')):
+        product_ids[order_id].append(product_id)
+
+    places = (
+        Place.objects
+            .found()
+            .filter(address__in={order.address for order in orders})
+            .in_bulk(field_name='address')
+    )
+
+    candidates = {}
+    for order in orders:
+        place = places.get(order.address)
+        if place is None:
+            continue
+        restaurant_ids = availability.get_restaurant_ids(product_ids[order.id])
+        candidates[order.id] = restaurant_index.nearest(
+            place.lat, place.lon,
+            k=settings.DISPATCH_CANDIDATES or None,
+            keys=set(restaurant_ids),
+        )
+    return candidates
+
+
+def dispatch_orders(batch_size=None):
+    """Назначает рестораны необработанным заказам без ресторана.
+
+    Заказы без координат ждут геокодера, а заказы, которые целиком
+    не соберёт ни один ресторан, — изменения меню или ресторанов.
+    Возвращает количество назначенных заказов.
+    """
+    batch_size = batch_size or settings.DISPATCH_BATCH_SIZE
+    restaurant_index = get_restaurant_index()
+    availability = get_availability()
+    loads = get_restaurant_loads()
+    skipped_order_ids = get_skipped_order_ids()
+
+    unassigned_orders = (
+        Order.objects
+            .filter(order_status='Необработанный', restaurant__isnull=True,
+                    address__in=Place.objects.found().values('address'))
+            .exclude(id__in=skipped_order_ids)
+            .only('id', 'address')
+            .order_by('id')
+    )
+    assigned = 0
+    last_order_id = 0
+    while True:
+        orders = list(unassigned_orders.filter(id__gt=last_order_id)[:batch_size])
+        if not orders:
+            return assigned
+        last_order_id = orders[-1].id
+        candidates = get_candidates(orders, restaurant_index, availability)
+        assignments = assign_restaurants(
+            candidates, loads, settings.DISPATCH_LOAD_PENALTY_KM
+        )
+        saved_assignments = save_assignments(assignments)
+        loads.update(saved_assignments.values())
+        assigned += len(saved_assignments)
+        skipped_order_ids.update(
+            order_id for order_id, order_candidates in candidates.items()
+            if not order_candidates
+        )
@@ -0,0 +1,59 @@
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = 422
+    default_detail = 'Этот ключ идемпотентности уже использован для другого заказа.'
+    default_code = 'idempotency_key_reused'
+
+
+def get_idempotency_key(request):
+    key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+    if key is None:
+        return None
+    key = key.strip()
+    max_length = IdempotencyKey._meta.get_field('key').max_length
+    if not key or len(key) > max_length:
+        raise ValidationError({IDEMPOTENCY_KEY_HEADER: [
+            f'Ключ должен быть непустой строкой не длиннее {max_length} символов.'
+        ]})
+    return key
+
+
+def get_request_hash(data):
+    dumped_data = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(dumped_data.encode()).hexdigest()
+
+
+def get_stored_response(key, request_hash):
+    stored_key = (
+        IdempotencyKey.objects
+            .actual()
+            .filter(key=key)
+            .only('request_hash', 'response')
+            .first()
+    )
+    if stored_key is None:
+        return None
+    if stored_key.request_hash != request_hash:
+        raise IdempotencyKeyReused()
+    return stored_key.response
+
+
+def reserve_key(key, request_hash):
+    """Занимает ключ в текущей транзакции.
+
+    Если тот же ключ параллельно занимает другой запрос, вставка ждёт
+    его транзакцию и падает с IntegrityError, когда она закоммичена.
+    """
+    IdempotencyKey.objects.expired().filter(key=key).delete()
+    return IdempotencyKey.objects.create(key=key, request_hash=request_hash)
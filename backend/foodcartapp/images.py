@@ -0,0 +1,111 @@
+import logging
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SIZES = {
+    'thumbnail': (100, 100),
+    'card': (400, 400),
+    'full': (1200, 1200),
+}
+
+IMAGE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def get_image_formats():
+    # Pillow без libwebp умеет только JPEG, WebP тогда просто не создаётся
+    if features.check('webp'):
+        return IMAGE_FORMATS
+    return {'jpeg': IMAGE_FORMATS['jpeg']}
+
+
+def open_image(image):
+    with image.open('rb'):
+        picture = Image.open(image)
+        picture.load()
+    picture = ImageOps.exif_transpose(picture)
+    has_alpha = picture.mode in ('RGBA', 'LA') or (
+        picture.mode == 'P' and 'transparency' in picture.info
+    )
+    return picture.convert('RGBA' if has_alpha else 'RGB')
+
+
+def save_image(storage, name, picture, image_format, options):
+    if image_format == 'JPEG' and picture.mode == 'RGBA':
+        background = Image.new('RGB', picture.size, 'white')
+        background.paste(picture, mask=picture.getchannel('A'))
+        picture = background
+
+    content = BytesIO()
+    picture.save(content, image_format, **options)
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(content.getvalue()))
+
+
+def make_image_variants(image):
+    """Сохраняет уменьшенные копии картинки во всех размерах и форматах.
+
+    Возвращает словарь для Product.image_variants: имя исходного файла
+    и для каждого размера — ширину, высоту и имена файлов по форматам.
+    Если картинку не удалось прочитать, возвращает пустой словарь.
+    """
+    try:
+        picture = open_image(image)
+    except (OSError, ValueError):
+        logger.exception('Не удалось открыть картинку %s', image.name)
+        return {}
+
+    stem, _ = os.path.splitext(image.name)
+    sizes = {}
+    for size_name, size in IMAGE_SIZES.items():
+        resized = picture.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+        variant = {'width': resized.width, 'height': resized.height}
+        for extension, (image_format, options) in get_image_formats().items():
+            name = f'variants/{stem}_{size_name}.{extension}'
+            variant[extension] = save_image(image.storage, name, resized,
+                                            image_format, options)
+        sizes[size_name] = variant
+    return {'source': image.name, 'sizes': sizes}
+
+
+def delete_image_variants(storage, image_variants):
+    for variant in image_variants.get('sizes', {}).values():
+        for extension in IMAGE_FORMATS:
+            if extension in variant:
+                storage.delete(variant[extension])
+
+
+def has_actual_variants(product):
+    return (bool(product.image) and
+            product.image_variants.get('source') == product.image.name)
+
+
+def dump_image_variants(product):
+    if not has_actual_variants(product):
+        return {}
+    storage = product.image.storage
+    return {
+        size_name: {
+            key: storage.url(value) if key in IMAGE_FORMATS else value
+            for key, value in variant.items()
+        }
+        for size_name, variant in product.image_variants['sizes'].items()
+    }
+
+
+def get_image_variant_url(product, size_name, extension='jpeg'):
+    if has_actual_variants(product):
+        variant = product.image_variants['sizes'].get(size_name, {})
+        if extension in variant:
+            return product.image.storage.url(variant[extension])
+    return product.image.url
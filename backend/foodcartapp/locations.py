@@ -0,0 +1,31 @@
+from django.db.models import OuterRef, Subquery
+
+from place.models import Place
+from place.spatial import SpatialIndex
+from .models import Restaurant
+from .versions import RESTAURANT_LOCATIONS, get_version
+
+
+_cached_index = None
+
+
+def build_restaurant_index():
+    places = Place.objects.filter(address=OuterRef('address'))
+    restaurants = (
+        Restaurant.objects
+            .annotate(
+                lat=Subquery(places.values('lat')[:1]),
+                lon=Subquery(places.values('lon')[:1]),
+            )
+            .filter(lat__isnull=False, lon__isnull=False)
+            .values_list('id', 'lat', 'lon')
+    )
+    return SpatialIndex(restaurants)
+
+
+def get_restaurant_index():
+    global _cached_index
+    version = get_version(RESTAURANT_LOCATIONS)
+    if _cached_index is None or _cached_index[0] != version:
+        _cached_index = (version, build_restaurant_index())
+    return _cached_index[1]
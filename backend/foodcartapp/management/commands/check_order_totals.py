@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Сверяет сохранённую стоимость заказов с суммой по товарам заказа'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Пересчитать стоимость заказов с расхождениями')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        drifted_orders = (
+            Order.objects
+                .order_price()
+                .exclude(total_price=F('calculated_price'))
+                .values_list('id', 'total_price', 'calculated_price')
+        )
+
+        drifted_ids = []
+        for order_id, total_price, calculated_price in drifted_orders.iterator(
+                chunk_size=options['chunk_size']):
+            self.stdout.write(
+                f'Заказ {order_id}: сохранено {total_price}, '
+                f'по товарам {calculated_price}'
+            )
+            drifted_ids.append(order_id)
+
+        if not drifted_ids:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+
+        if not options['fix']:
+            self.stdout.write(self.style.WARNING(
+                f'Заказов с расхождениями: {len(drifted_ids)}. '
+                f'Запустите с --fix, чтобы их исправить'
+            ))
+            return
+
+        chunk_size = options['chunk_size']
+        for start in range(0, len(drifted_ids), chunk_size):
+            Order.objects.filter(
+                id__in=drifted_ids[start:start + chunk_size]
+            ).update_total_price()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено заказов: {len(drifted_ids)}'
+        ))
@@ -0,0 +1,41 @@
+from django.contrib.staticfiles import finders
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from foodcartapp.models import Banner
+from foodcartapp.versions import BANNERS, bump_version
+
+
+DEFAULT_BANNERS = [
+    ('Burger', 'burger.jpg', 'Tasty Burger at your door step'),
+    ('Spices', 'food.jpg', 'All Cuisines'),
+    ('New York', 'tasty.jpg', 'Food is incomplete without a tasty dessert'),
+]
+
+
+def copy_image(file_name):
+    path = finders.find(file_name)
+    if path is None:
+        raise CommandError(f'Нет картинки {file_name} в статике')
+    name = f'banners/{file_name}'
+    if default_storage.exists(name):
+        return name
+    with open(path, 'rb') as file:
+        return default_storage.save(name, File(file))
+
+
+class Command(BaseCommand):
+    help = 'Создаёт баннеры по умолчанию, если в базе ещё нет ни одного'
+
+    def handle(self, *args, **options):
+        if Banner.objects.exists():
+            self.stdout.write('Баннеры уже есть, ничего не создано')
+            return
+        Banner.objects.bulk_create([
+            Banner(title=title, image=copy_image(file_name), text=text,
+                   order=order)
+            for order, (title, file_name, text) in enumerate(DEFAULT_BANNERS)
+        ])
+        bump_version(BANNERS)
+        self.stdout.write(f'Создано баннеров: {len(DEFAULT_BANNERS)}')
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.dispatch import dispatch_orders
+
+
+class Command(BaseCommand):
+    help = 'Назначает рестораны новым заказам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Распределить заказы один раз и выйти')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--sleep', type=float, default=10,
+                            help='Пауза между запусками, сек')
+
+    def handle(self, *args, **options):
+        while True:
+            assigned = dispatch_orders(options['batch_size'])
+            if assigned:
+                self.stdout.write(f'Назначено заказов: {assigned}')
+            if options['once']:
+                return
+            time.sleep(options['sleep'])
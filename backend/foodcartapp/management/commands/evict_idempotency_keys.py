@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Удаляет просроченные ключи идемпотентности заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        expired_keys = IdempotencyKey.objects.expired()
+        deleted = 0
+        while True:
+            key_ids = list(
+                expired_keys.values_list('id', flat=True)[:options['chunk_size']]
+            )
+            if not key_ids:
+                break
+            chunk_deleted, _ = IdempotencyKey.objects.filter(id__in=key_ids).delete()
+            deleted += chunk_deleted
+        self.stdout.write(f'Удалено ключей: {deleted}')
@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.menu_io import FORMATS, MENU_ITEM_FIELDS, PRODUCT_FIELDS
+from foodcartapp.menu_io import guess_format, iter_menu_items, iter_products
+from foodcartapp.menu_io import write_rows
+
+
+class Command(BaseCommand):
+    help = 'Выгружает товары или меню ресторанов в CSV или JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['products', 'menu'])
+        parser.add_argument('--output', default='-',
+                            help='Файл для выгрузки, по умолчанию stdout')
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='По умолчанию определяется по расширению файла')
+        parser.add_argument('--restaurant', type=int, default=None,
+                            help='Выгрузить меню только этого ресторана')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or guess_format(options['output'])
+        if options['kind'] == 'products':
+            fields = PRODUCT_FIELDS
+            rows = iter_products(options['chunk_size'])
+        else:
+            fields = MENU_ITEM_FIELDS
+            rows = iter_menu_items(options['chunk_size'], options['restaurant'])
+
+        if options['output'] == '-':
+            write_rows(sys.stdout, file_format, fields, rows)
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as file:
+            write_rows(file, file_format, fields, rows)
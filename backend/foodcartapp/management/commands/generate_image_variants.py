@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.images import has_actual_variants, make_image_variants
+from foodcartapp.models import Product
+from foodcartapp.versions import CATALOG, bump_version
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии картинок товаров, у которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Пересоздать копии у всех товаров')
+
+    def handle(self, *args, **options):
+        products = (
+            Product.objects
+                .exclude(image='')
+                .only('id', 'image', 'image_variants')
+                .order_by('id')
+        )
+        # Один файл бывает у многих товаров, копии для него делаются один раз
+        variants_by_image = {}
+        updated = 0
+        failed_ids = []
+        for product in products.iterator():
+            if not options['force'] and has_actual_variants(product):
+                continue
+            if product.image.name not in variants_by_image:
+                variants_by_image[product.image.name] = make_image_variants(product.image)
+            image_variants = variants_by_image[product.image.name]
+            if not image_variants:
+                failed_ids.append(product.pk)
+                continue
+            Product.objects.filter(pk=product.pk).update(
+                image_variants=image_variants
+            )
+            updated += 1
+
+        if updated:
+            bump_version(CATALOG)
+        self.stdout.write(f'Обновлено товаров: {updated}, '
+                          f'картинок: {len(variants_by_image)}')
+        if failed_ids:
+            self.stderr.write(self.style.ERROR(
+                f'Не удалось прочитать картинки у товаров: {len(failed_ids)}, '
+                f"id: {', '.join(map(str, failed_ids))}"
+            ))
@@ -0,0 +1,69 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from foodcartapp.menu_io import FORMATS, InvalidRow, guess_format, import_rows
+from foodcartapp.menu_io import MenuItemsImporter, ProductsImporter, read_rows
+from foodcartapp.models import Restaurant
+
+
+MAX_REPORTED_LINES = 100
+
+
+def format_lines(line_numbers):
+    reported = ', '.join(map(str, line_numbers[:MAX_REPORTED_LINES]))
+    if len(line_numbers) > MAX_REPORTED_LINES:
+        reported += f' и ещё {len(line_numbers) - MAX_REPORTED_LINES}'
+    return reported
+
+
+class Command(BaseCommand):
+    help = 'Загружает товары или меню ресторанов из CSV или JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['products', 'menu'])
+        parser.add_argument('input', help='Файл для загрузки, «-» — stdin')
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='По умолчанию определяется по расширению файла')
+        parser.add_argument('--restaurant', type=int, default=None,
+                            help='Загрузить все строки меню в этот ресторан')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or guess_format(options['input'])
+        if options['kind'] == 'products':
+            importer = ProductsImporter()
+        else:
+            if options['restaurant'] is not None and not Restaurant.objects.filter(
+                    id=options['restaurant']).exists():
+                raise CommandError(f"Нет ресторана с id {options['restaurant']}")
+            importer = MenuItemsImporter(options['restaurant'])
+
+        if options['input'] == '-':
+            self.import_file(sys.stdin, file_format, importer, options['batch_size'])
+        else:
+            with open(options['input'], newline='', encoding='utf-8') as file:
+                self.import_file(file, file_format, importer, options['batch_size'])
+
+        self.stdout.write(
+            f'Создано: {importer.created}, обновлено: {importer.updated}, '
+            f'пропущено: {importer.skipped}'
+        )
+        if importer.skipped_lines:
+            self.stdout.write(self.style.WARNING(
+                'Пропущены строки: ' + format_lines(sorted(importer.skipped_lines))
+            ))
+        if options['kind'] == 'products' and importer.created:
+            self.stdout.write('Для новых товаров запустите generate_image_variants')
+
+    def import_file(self, file, file_format, importer, batch_size):
+        rows = read_rows(file, file_format)
+        processed = 0
+        try:
+            for processed in import_rows(importer, rows, batch_size):
+                self.stderr.write(f'Обработано строк: {processed}', ending='\r')
+        except InvalidRow as error:
+            self.stderr.write('')
+            raise CommandError(f'Ошибка в файле, {error}. '
+                               f'Сохранено строк до ошибки: {processed}')
+        self.stderr.write('')
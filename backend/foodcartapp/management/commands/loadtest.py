@@ -0,0 +1,266 @@
+import json
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+
+ENDPOINTS = {
+    'products': ('GET', '/api/products/'),
+    'banners': ('GET', '/api/banners/'),
+    'order': ('POST', '/api/order/'),
+}
+
+# Как в App.js: каждая загрузка страницы запрашивает товары и баннеры,
+# а заказ оформляет лишь часть посетителей
+DEFAULT_MIX = 'products=10,banners=10,order=1'
+
+JSON_HEADERS = {
+    'Accept': 'application/json',
+    'Content-Type': 'application/json',
+}
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise CommandError(f'Неизвестный эндпоинт в --mix: {name}')
+        try:
+            weights[name] = float(weight)
+        except ValueError:
+            raise CommandError(f'Неверный вес в --mix: {part}')
+    if not any(weights.values()):
+        raise CommandError('В --mix нет ни одного эндпоинта с весом больше нуля')
+    return weights
+
+
+def percentile(sorted_values, share):
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(share * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    # latencies — только успешные ответы: ошибки и таймауты приходят
+    # за другое время и искажали бы перцентили
+    latencies = sorted(latencies)
+    milliseconds = [latency * 1000 for latency in latencies]
+    requests_count = len(latencies) + errors
+    return {
+        'requests': requests_count,
+        'errors': errors,
+        'error_rate': round(errors / requests_count, 4) if requests_count else None,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(milliseconds) / len(milliseconds), 2) if milliseconds else None,
+            'p50': round(percentile(milliseconds, 0.50), 2) if milliseconds else None,
+            'p95': round(percentile(milliseconds, 0.95), 2) if milliseconds else None,
+            'p99': round(percentile(milliseconds, 0.99), 2) if milliseconds else None,
+            'max': round(milliseconds[-1], 2) if milliseconds else None,
+        },
+    }
+
+
+class LoadTest:
+    def __init__(self, base_url, weights, product_ids, deadline, max_requests,
+                 max_cart_size, timeout, seed):
+        self.base_url = base_url.rstrip('/')
+        self.names = list(weights)
+        self.weights = [weights[name] for name in self.names]
+        self.product_ids = product_ids
+        self.deadline = deadline
+        self.max_requests = max_requests
+        self.max_cart_size = max_cart_size
+        self.timeout = timeout
+        self.seed = seed
+        self.sent = 0
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def take_request(self):
+        if time.monotonic() >= self.deadline:
+            return False
+        with self.lock:
+            if self.max_requests is not None and self.sent >= self.max_requests:
+                return False
+            self.sent += 1
+        return True
+
+    def make_order(self, randomizer):
+        cart_size = randomizer.randint(1, min(self.max_cart_size, len(self.product_ids)))
+        return {
+            'products': [
+                {'product': product_id, 'quantity': randomizer.randint(1, 3)}
+                for product_id in randomizer.sample(self.product_ids, cart_size)
+            ],
+            'firstname': 'Нагрузочный',
+            'lastname': 'Тест',
+            'phonenumber': '+79000000000',
+            'address': f'Москва, тестовая улица, {randomizer.randint(1, 500)}',
+        }
+
+    def run_client(self, client_number):
+        randomizer = random.Random(
+            None if self.seed is None else self.seed + client_number
+        )
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        with requests.Session() as session:
+            while self.take_request():
+                name, = randomizer.choices(self.names, self.weights)
+                method, path = ENDPOINTS[name]
+                payload = self.make_order(randomizer) if method == 'POST' else None
+                started_at = time.perf_counter()
+                try:
+                    response = session.request(
+                        method, self.base_url + path, json=payload,
+                        headers=JSON_HEADERS, timeout=self.timeout,
+                    )
+                    response.content
+                    failed = not response.ok
+                except requests.RequestException:
+                    failed = True
+                if failed:
+                    errors[name] += 1
+                else:
+                    latencies[name].append(time.perf_counter() - started_at)
+
+        with self.lock:
+            for name, values in latencies.items():
+                self.latencies[name].extend(values)
+            for name, count in errors.items():
+                self.errors[name] += count
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест публичного API: /api/products/, /api/banners/, /api/order/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--clients', type=int, default=20,
+                            help='Количество одновременных клиентов')
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Длительность теста, сек')
+        parser.add_argument('--requests', type=int, default=None,
+                            help='Остановиться после N запросов')
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help='Веса эндпоинтов, например products=10,banners=10,order=1')
+        parser.add_argument('--max-cart-size', type=int, default=5)
+        parser.add_argument('--timeout', type=float, default=10)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--label', default='',
+                            help='Подпись прогона, попадает в JSON с результатами')
+        parser.add_argument('--output', default=None,
+                            help='Куда сохранить результаты в формате JSON')
+        parser.add_argument('--compare', default=None,
+                            help='JSON прошлого прогона для сравнения')
+
+    def handle(self, *args, **options):
+        weights = parse_mix(options['mix'])
+        base_url = options['base_url'].rstrip('/')
+
+        response = requests.get(base_url + ENDPOINTS['products'][1],
+                                headers=JSON_HEADERS, timeout=options['timeout'])
+        response.raise_for_status()
+        product_ids = [product['id'] for product in response.json()]
+        if weights.get('order') and not product_ids:
+            raise CommandError('Каталог пуст: сначала запустите seed_catalog')
+
+        load_test = LoadTest(
+            base_url=base_url,
+            weights=weights,
+            product_ids=product_ids,
+            deadline=time.monotonic() + options['duration'],
+            max_requests=options['requests'],
+            max_cart_size=options['max_cart_size'],
+            timeout=options['timeout'],
+            seed=options['seed'],
+        )
+
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['clients']) as executor:
+            list(executor.map(load_test.run_client, range(options['clients'])))
+        elapsed = time.perf_counter() - started
+
+        all_latencies = [
+            latency for values in load_test.latencies.values() for latency in values
+        ]
+        results = {
+            'label': options['label'],
+            'started_at': started_at.isoformat(),
+            'elapsed_s': round(elapsed, 3),
+            'config': {
+                'base_url': base_url,
+                'clients': options['clients'],
+                'duration': options['duration'],
+                'requests': options['requests'],
+                'mix': weights,
+                'max_cart_size': options['max_cart_size'],
+                'catalog_size': len(product_ids),
+            },
+            'endpoints': {
+                name: summarize(load_test.latencies[name],
+                                load_test.errors[name], elapsed)
+                for name in weights
+                if load_test.latencies[name] or load_test.errors[name]
+            },
+            'total': summarize(all_latencies, sum(load_test.errors.values()),
+                               elapsed),
+        }
+
+        self.print_results(results)
+        if options['compare']:
+            with open(options['compare']) as file:
+                self.print_comparison(json.load(file), results)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, ensure_ascii=False, indent=4)
+
+    def print_results(self, results):
+        self.stdout.write(
+            f"{'эндпоинт':<10}{'запросов':>10}{'ошибок':>8}{'rps':>10}"
+            f"{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}"
+        )
+        rows = list(results['endpoints'].items()) + [('всего', results['total'])]
+        for name, summary in rows:
+            latency = summary['latency_ms']
+            # Перцентили считаются по успешным ответам, без них значений нет
+            values = [
+                '-' if value is None else value
+                for value in [summary['throughput_rps'], latency['p50'],
+                              latency['p95'], latency['p99']]
+            ]
+            self.stdout.write(
+                f"{name:<10}{summary['requests']:>10}{summary['errors']:>8}"
+                + ''.join(f'{value:>10}' for value in values)
+            )
+
+    def print_comparison(self, previous, current):
+        self.stdout.write(f"Сравнение с прогоном «{previous.get('label', '')}»:")
+        for name, summary in current['endpoints'].items():
+            if name not in previous['endpoints']:
+                continue
+            before = previous['endpoints'][name]
+            changes = []
+            for metric in ['p50', 'p95', 'p99']:
+                old = before['latency_ms'][metric]
+                new = summary['latency_ms'][metric]
+                if old and new is not None:
+                    changes.append(f'{metric} ×{new / old:.2f}')
+            if before['throughput_rps'] and summary['throughput_rps'] is not None:
+                changes.append(
+                    f"rps ×{summary['throughput_rps'] / before['throughput_rps']:.2f}"
+                )
+            self.stdout.write(f"{name:<10}" + ', '.join(changes))
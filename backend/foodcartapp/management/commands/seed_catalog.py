@@ -0,0 +1,81 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodcartapp.models import Product, ProductCategory
+from foodcartapp.models import Restaurant, RestaurantMenuItem
+from foodcartapp.versions import CATALOG, MENU, RESTAURANT_LOCATIONS
+from foodcartapp.versions import bump_version_on_commit
+from place.geocoders import LocalGeocoder
+from place.models import Place
+
+
+class Command(BaseCommand):
+    help = 'Заполняет локальную базу тестовым каталогом для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=20)
+        parser.add_argument('--categories', type=int, default=8)
+        parser.add_argument('--products', type=int, default=300)
+        parser.add_argument('--availability', type=float, default=0.8,
+                            help='Доля товаров в меню каждого ресторана')
+        parser.add_argument('--image', default='burger.jpg',
+                            help='Имя файла картинки для всех товаров')
+        parser.add_argument('--seed', type=int, default=None)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        randomizer = random.Random(options['seed'])
+
+        categories = ProductCategory.objects.bulk_create([
+            ProductCategory(name=f'Категория {number}')
+            for number in range(1, options['categories'] + 1)
+        ])
+        categories = list(ProductCategory.objects.order_by('-id')[:len(categories)])
+
+        products = Product.objects.bulk_create([
+            Product(
+                name=f'Товар {number}',
+                category=randomizer.choice(categories),
+                price=randomizer.randint(50, 900),
+                image=options['image'],
+                special_status=randomizer.random() < 0.1,
+                description=f'Описание товара {number}',
+            )
+            for number in range(1, options['products'] + 1)
+        ])
+        products = list(Product.objects.order_by('-id')[:len(products)])
+
+        restaurants = Restaurant.objects.bulk_create([
+            Restaurant(
+                name=f'Star Burger {number}',
+                address=f'Москва, тестовая улица, {number}',
+                contact_phone='+70000000000',
+            )
+            for number in range(1, options['restaurants'] + 1)
+        ])
+        restaurants = list(Restaurant.objects.order_by('-id')[:len(restaurants)])
+
+        geocoder = LocalGeocoder()
+        places = []
+        for restaurant in restaurants:
+            lat, lon = geocoder(restaurant.address)
+            places.append(Place(address=restaurant.address, lat=lat, lon=lon))
+        Place.objects.bulk_create(places, ignore_conflicts=True)
+
+        RestaurantMenuItem.objects.bulk_create([
+            RestaurantMenuItem(restaurant=restaurant, product=product,
+                               availability=True)
+            for restaurant in restaurants
+            for product in products
+            if randomizer.random() < options['availability']
+        ], batch_size=1000)
+
+        bump_version_on_commit(CATALOG)
+        bump_version_on_commit(MENU)
+        bump_version_on_commit(RESTAURANT_LOCATIONS)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: категорий {len(categories)}, товаров {len(products)}, '
+            f'ресторанов {len(restaurants)}'
+        ))
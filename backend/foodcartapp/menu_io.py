@@ -0,0 +1,315 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from .models import Product, ProductCategory
+from .models import Restaurant, RestaurantMenuItem
+from .versions import CATALOG, MENU, bump_version
+
+
+FORMATS = ['csv', 'jsonl']
+
+PRODUCT_FIELDS = ['id', 'name', 'category', 'price', 'image',
+                  'special_status', 'description']
+MENU_ITEM_FIELDS = ['restaurant', 'product', 'availability']
+
+# Поле price: 8 знаков, из них 2 после запятой
+MAX_PRICE = Decimal(10 ** 6)
+
+
+class InvalidRow(Exception):
+    pass
+
+
+def guess_format(path):
+    return 'jsonl' if path.endswith(('.jsonl', '.json')) else 'csv'
+
+
+def read_rows(file, file_format):
+    """Построчно читает CSV с заголовком или JSON Lines.
+
+    Перебирает пары (номер строки, словарь с полями).
+    """
+    if file_format == 'csv':
+        yield from enumerate(csv.DictReader(file), start=2)
+        return
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise InvalidRow(f'строка {line_number}: это не JSON')
+        if not isinstance(row, dict):
+            raise InvalidRow(f'строка {line_number}: ожидался JSON-объект')
+        yield line_number, row
+
+
+def write_rows(file, file_format, fields, rows):
+    if file_format == 'csv':
+        writer = csv.DictWriter(file, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+        return
+    for row in rows:
+        file.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+
+
+def iter_batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in ('1', 'true', 'yes', 'да'):
+        return True
+    if value in ('', '0', 'false', 'no', 'нет'):
+        return False
+    raise ValueError(value)
+
+
+def parse_id(value):
+    if value is None or value == '':
+        return None
+    value = int(value)
+    if value <= 0:
+        raise ValueError(value)
+    return value
+
+
+def reset_sequence(model):
+    # Строки с явным id не двигают последовательность в PostgreSQL,
+    # и следующий товар без id получил бы уже занятый id
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+            cursor.execute(sql)
+
+
+def iter_products(chunk_size):
+    products = (
+        Product.objects
+            .order_by('id')
+            .values_list('id', 'name', 'category__name', 'price', 'image',
+                         'special_status', 'description')
+            .iterator(chunk_size=chunk_size)
+    )
+    for product in products:
+        yield dict(zip(PRODUCT_FIELDS, product))
+
+
+def iter_menu_items(chunk_size, restaurant_id=None):
+    menu_items = RestaurantMenuItem.objects.order_by('id')
+    if restaurant_id is not None:
+        menu_items = menu_items.filter(restaurant_id=restaurant_id)
+    menu_items = (
+        menu_items
+            .values_list('restaurant_id', 'product_id', 'availability')
+            .iterator(chunk_size=chunk_size)
+    )
+    for menu_item in menu_items:
+        yield dict(zip(MENU_ITEM_FIELDS, menu_item))
+
+
+class ProductsImporter:
+    """Загружает товары пачками.
+
+    Строки с id обновляют товары с этим id, а если таких нет — создают
+    их с тем же id, чтобы после выгрузки меню ссылалось на те же товары.
+    Строки без id создают новые товары. Категории ищутся по названию
+    и создаются, если их нет.
+    """
+
+    def __init__(self):
+        self.categories = dict(ProductCategory.objects.values_list('name', 'id'))
+        self.created = 0
+        self.updated = 0
+        self.skipped_lines = []
+
+    @property
+    def skipped(self):
+        return len(self.skipped_lines)
+
+    def get_category_id(self, name):
+        if not name:
+            return None
+        if name not in self.categories:
+            self.categories[name] = ProductCategory.objects.create(name=name).id
+        return self.categories[name]
+
+    def parse(self, line_number, row):
+        try:
+            name = row['name']
+            description = row.get('description') or ''
+            price = Decimal(str(row['price']))
+            if not name or len(name) > 50 or len(description) > 200:
+                raise ValueError(name)
+            if not price.is_finite() or not 0 <= price < MAX_PRICE:
+                raise ValueError(price)
+            return Product(
+                id=parse_id(row.get('id')),
+                name=name,
+                category_id=self.get_category_id(row.get('category')),
+                price=price,
+                image=row.get('image') or '',
+                special_status=parse_bool(row.get('special_status', False)),
+                description=description,
+            )
+        except KeyError as error:
+            raise InvalidRow(f'строка {line_number}: нет поля {error}')
+        except (TypeError, ValueError, InvalidOperation):
+            raise InvalidRow(f'строка {line_number}: неверное значение')
+
+    def save(self, batch):
+        products = {}
+        new_products = []
+        for line_number, row in batch:
+            product = self.parse(line_number, row)
+            if product.id is None:
+                new_products.append(product)
+                continue
+            # Из повторов одного id в пачке сохраняется последний
+            if product.id in products:
+                self.skipped_lines.append(products[product.id][0])
+            products[product.id] = line_number, product
+        existing_ids = set(
+            Product.objects
+                .filter(id__in=products)
+                .values_list('id', flat=True)
+        )
+        changed_products = []
+        restored_products = []
+        for product_id, (_, product) in products.items():
+            if product_id in existing_ids:
+                changed_products.append(product)
+            else:
+                restored_products.append(product)
+        if restored_products:
+            Product.objects.bulk_create(restored_products)
+            reset_sequence(Product)
+        Product.objects.bulk_create(new_products)
+        Product.objects.bulk_update(changed_products, [
+            'name', 'category', 'price', 'image', 'special_status', 'description',
+        ])
+        self.created += len(new_products) + len(restored_products)
+        self.updated += len(changed_products)
+
+    def finish(self):
+        bump_version(CATALOG)
+
+
+class MenuItemsImporter:
+    """Загружает пункты меню пачками.
+
+    Пара (ресторан, товар) уникальна: существующие пункты обновляются
+    двумя UPDATE — для включённых и выключенных, новые создаются через
+    bulk_create, а пункты, которые успел создать кто-то другой,
+    пропускаются ignore_conflicts.
+    Строки с несуществующими ресторанами и товарами пропускаются,
+    их номера собираются в skipped_lines.
+    """
+
+    def __init__(self, restaurant_id=None):
+        self.restaurant_id = restaurant_id
+        self.created = 0
+        self.updated = 0
+        self.skipped_lines = []
+
+    @property
+    def skipped(self):
+        return len(self.skipped_lines)
+
+    def parse(self, line_number, row):
+        try:
+            restaurant_id = self.restaurant_id or parse_id(row['restaurant'])
+            product_id = parse_id(row['product'])
+            if restaurant_id is None or product_id is None:
+                raise ValueError
+            availability = parse_bool(row.get('availability', True))
+        except KeyError as error:
+            raise InvalidRow(f'строка {line_number}: нет поля {error}')
+        except (TypeError, ValueError):
+            raise InvalidRow(f'строка {line_number}: неверное значение')
+        return (restaurant_id, product_id), availability
+
+    def save(self, batch):
+        cells = {}
+        for line_number, row in batch:
+            cell, availability = self.parse(line_number, row)
+            # Повтор ячейки в той же пачке перекрывает предыдущую строку
+            if cell in cells:
+                self.skipped_lines.append(cells[cell][0])
+            cells[cell] = line_number, availability
+        restaurant_ids = set(
+            Restaurant.objects
+                .filter(id__in={restaurant_id for restaurant_id, _ in cells})
+                .values_list('id', flat=True)
+        )
+        product_ids = set(
+            Product.objects
+                .filter(id__in={product_id for _, product_id in cells})
+                .values_list('id', flat=True)
+        )
+        existing_items = {
+            (item.restaurant_id, item.product_id): item
+            for item in RestaurantMenuItem.objects
+                .filter(restaurant_id__in=restaurant_ids,
+                        product_id__in=product_ids)
+                .only('id', 'restaurant_id', 'product_id', 'availability')
+        }
+
+        new_items = []
+        changed_item_ids = {True: [], False: []}
+        for (restaurant_id, product_id), (line_number, availability) in cells.items():
+            if restaurant_id not in restaurant_ids or product_id not in product_ids:
+                self.skipped_lines.append(line_number)
+                continue
+            item = existing_items.get((restaurant_id, product_id))
+            if item is None:
+                new_items.append(RestaurantMenuItem(
+                    restaurant_id=restaurant_id,
+                    product_id=product_id,
+                    availability=availability,
+                ))
+            elif item.availability != availability:
+                changed_item_ids[availability].append(item.id)
+
+        RestaurantMenuItem.objects.bulk_create(new_items, ignore_conflicts=True)
+        # bulk_update строит CASE на каждую строку, а значений здесь всего два
+        for availability, item_ids in changed_item_ids.items():
+            if item_ids:
+                self.updated += (
+                    RestaurantMenuItem.objects
+                        .filter(id__in=item_ids)
+                        .update(availability=availability)
+                )
+        self.created += len(new_items)
+
+    def finish(self):
+        bump_version(MENU)
+        bump_version(CATALOG)
+
+
+def import_rows(importer, rows, batch_size):
+    """Сохраняет строки пачками по batch_size.
+
+    После каждой пачки перебирает число обработанных строк, чтобы
+    команда могла показать прогресс.
+    """
+    processed = 0
+    for batch in iter_batches(rows, batch_size):
+        with transaction.atomic():
+            importer.save(batch)
+        processed += len(batch)
+        yield processed
+    importer.finish()
@@ -0,0 +1,38 @@
+# Generated by Django 3.0.7 on 2026-10-18 19:14
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_total_price(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    OrderProduct = apps.get_model('foodcartapp', 'OrderProduct')
+    products_price = (
+        OrderProduct.objects
+            .filter(order=OuterRef('pk'))
+            .values('order')
+            .annotate(price=Sum(F('price') * F('quantity'),
+                                output_field=DecimalField()))
+            .values('price')
+    )
+    Order.objects.update(total_price=Coalesce(
+        Subquery(products_price, output_field=DecimalField()), 0
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0059_auto_20210817_1336'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Стоимость заказа'),
+        ),
+        migrations.RunPython(fill_total_price, migrations.RunPython.noop),
+    ]
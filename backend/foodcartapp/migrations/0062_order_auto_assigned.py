@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 19:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0061_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='auto_assigned',
+            field=models.BooleanField(default=False, verbose_name='Ресторан выбран автоматически'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.1.14 on 2026-10-18 19:33
+
+from django.db import migrations
+
+
+# Триграммные индексы ускоряют icontains из поиска в админке и API:
+# Django на PostgreSQL ищет через UPPER(поле::text) LIKE UPPER(...).
+# Полнотекстовый индекс совпадает с выражением из foodcartapp.search.
+CREATE_SEARCH_INDEXES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS foodcartapp_product_name_trgm '
+    'ON foodcartapp_product USING gin (UPPER(name::text) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS foodcartapp_productcategory_name_trgm '
+    'ON foodcartapp_productcategory USING gin (UPPER(name::text) gin_trgm_ops)',
+    "CREATE INDEX IF NOT EXISTS foodcartapp_product_search "
+    "ON foodcartapp_product USING gin "
+    "(to_tsvector('russian', name || ' ' || description))",
+]
+
+DROP_SEARCH_INDEXES = [
+    'DROP INDEX IF EXISTS foodcartapp_product_name_trgm',
+    'DROP INDEX IF EXISTS foodcartapp_productcategory_name_trgm',
+    'DROP INDEX IF EXISTS foodcartapp_product_search',
+]
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0064_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgresql(CREATE_SEARCH_INDEXES),
+                             run_on_postgresql(DROP_SEARCH_INDEXES)),
+    ]
@@ -1,7 +1,9 @@
+from django.conf import settings
 from django.db import models
 from django.core.validators import MinValueValidator
 from phonenumber_field.modelfields import PhoneNumberField
-from django.db.models import Sum, F, DecimalField
+from django.db.models import Sum, F, DecimalField, OuterRef, Subquery, Q
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 
@@ -44,6 +46,8 @@ class Product(models.Model):
     price = models.DecimalField('цена', max_digits=8, decimal_places=2,
                                 validators=[MinValueValidator(0)])
     image = models.ImageField('картинка')
+    image_variants = models.JSONField('уменьшенные копии картинки',
+                                      default=dict, blank=True, editable=False)
     special_status = models.BooleanField('спец.предложение', default=False,
                                          db_index=True)
     description = models.TextField('описание', max_length=200, blank=True)
@@ -89,11 +93,44 @@ class RestaurantMenuItem(models.Model):
 class OrderQueryset(models.QuerySet):
 
     def order_price(self):
-        total_price = self.annotate(
-            total_price=Sum(F('products__price') * F('products__quantity'),
-            output_field=DecimalField())
+        calculated_price = self.annotate(
+            calculated_price=Coalesce(
+                Sum(F('products__price') * F('products__quantity'),
+                    output_field=DecimalField()),
+                0
+            )
+        )
+        return calculated_price
+
+    def update_total_price(self):
+        products_price = (
+            OrderProduct.objects
+                .filter(order=OuterRef('pk'))
+                .values('order')
+                .annotate(price=Sum(F('price') * F('quantity'),
+                                    output_field=DecimalField()))
+                .values('price')
+        )
+        return self.update(total_price=Coalesce(
+            Subquery(products_price, output_field=DecimalField()), 0
+        ))
+
+    def in_progress(self, now=None):
+        # Статусов «выполнен» и «отменён» нет, а время доставки отмечают
+        # не всегда, поэтому давние заказы считаются закрытыми
+        started_after = (now or timezone.now()) - settings.DISPATCH_LOAD_WINDOW
+        return self.filter(restaurant__isnull=False, delivered_at__isnull=True,
+                           registrated_at__gte=started_after)
+
+    def claimable(self, now=None):
+        claim_expired_at = (now or timezone.now()) - settings.ORDER_CLAIM_TIMEOUT
+        return self.filter(order_status='Необработанный').filter(
+            Q(claimed_at__isnull=True) | Q(claimed_at__lt=claim_expired_at)
         )
-        return total_price
+
+    def claimed_by_manager(self, manager, now=None):
+        claim_expired_at = (now or timezone.now()) - settings.ORDER_CLAIM_TIMEOUT
+        return self.filter(claimed_by=manager, claimed_at__gte=claim_expired_at)
 
 
 class Order(models.Model):
@@ -118,7 +155,7 @@ class Order(models.Model):
                                       db_index=True)
     firstname = models.CharField('Имя', max_length=50)
     lastname = models.CharField('Фамилия', max_length=50)
-    phonenumber = PhoneNumberField('Телефон')
+    phonenumber = PhoneNumberField('Телефон', db_index=True)
     address = models.CharField('Адрес', max_length=100)
     comment = models.TextField('Комментарий к заказу',
                                max_length=200,
@@ -131,12 +168,26 @@ class Order(models.Model):
     delivered_at = models.DateTimeField("Время доставки",
                                         blank=True, null=True,
                                         db_index=True)
+    total_price = models.DecimalField('Стоимость заказа',
+                                      max_digits=10, decimal_places=2,
+                                      default=0,
+                                      validators=[MinValueValidator(0)])
     restaurant = models.ForeignKey(Restaurant,
                                    on_delete=models.CASCADE,
                                    related_name='orders',
                                    verbose_name="Ресторан",
                                    null=True,
                                    blank=True)
+    auto_assigned = models.BooleanField('Ресторан выбран автоматически',
+                                        default=False)
+    claimed_by = models.ForeignKey(settings.AUTH_USER_MODEL,
+                                   on_delete=models.SET_NULL,
+                                   related_name='claimed_orders',
+                                   verbose_name='Менеджер',
+                                   null=True,
+                                   blank=True)
+    claimed_at = models.DateTimeField('Взят в работу', blank=True, null=True,
+                                      db_index=True)
 
     objects = OrderQueryset.as_manager()
 
@@ -147,6 +198,14 @@ class Order(models.Model):
     def __str__(self):
         return (f"{self.firstname} {self.lastname}, {self.address}")
 
+    def get_active_claim(self, now=None):
+        if self.claimed_at is None:
+            return None
+        claim_expired_at = (now or timezone.now()) - settings.ORDER_CLAIM_TIMEOUT
+        if self.claimed_at < claim_expired_at:
+            return None
+        return self.claimed_by_id
+
 
 class OrderProduct(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE,
@@ -168,3 +227,62 @@ class OrderProduct(models.Model):
         return self.product.name
 
 
+class IdempotencyKeyQuerySet(models.QuerySet):
+    def expired(self):
+        return self.filter(
+            created_at__lt=timezone.now() - settings.IDEMPOTENCY_KEY_TTL
+        )
+
+    def actual(self):
+        return self.filter(
+            created_at__gte=timezone.now() - settings.IDEMPOTENCY_KEY_TTL
+        )
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField('ключ', max_length=255, unique=True)
+    request_hash = models.CharField('хеш запроса', max_length=64)
+    response = models.JSONField('ответ', null=True, blank=True)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE,
+                              related_name='idempotency_keys',
+                              verbose_name='заказ',
+                              null=True, blank=True)
+    created_at = models.DateTimeField('создан', default=timezone.now,
+                                      db_index=True)
+
+    objects = IdempotencyKeyQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'ключ идемпотентности'
+        verbose_name_plural = 'ключи идемпотентности'
+
+    def __str__(self):
+        return self.key
+
+
+class BannerQuerySet(models.QuerySet):
+    def active(self, now=None):
+        now = now or timezone.now()
+        return self.filter(
+            Q(active_from__isnull=True) | Q(active_from__lte=now),
+            Q(active_until__isnull=True) | Q(active_until__gt=now),
+        )
+
+
+class Banner(models.Model):
+    title = models.CharField('заголовок', max_length=50)
+    text = models.CharField('текст', max_length=200, blank=True)
+    image = models.ImageField('картинка', upload_to='banners')
+    order = models.PositiveIntegerField('порядок', default=0, db_index=True)
+    active_from = models.DateTimeField('показывать с', null=True, blank=True)
+    active_until = models.DateTimeField('показывать до', null=True, blank=True)
+
+    objects = BannerQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'баннер'
+        verbose_name_plural = 'баннеры'
+        ordering = ['order', 'id']
+
+    def __str__(self):
+        return self.title
@@ -0,0 +1,37 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+# Меньше этого числа строк точный COUNT(*) обходится дёшево
+EXACT_COUNT_LIMIT = 10000
+
+
+def estimate_count(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор для больших таблиц PostgreSQL.
+
+    Число строк берётся из оценки планировщика, и только если она меньше
+    EXACT_COUNT_LIMIT, выполняется точный COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        estimated_count = estimate_count(self.object_list)
+        if estimated_count is None or estimated_count < EXACT_COUNT_LIMIT:
+            return super().count
+        return estimated_count
@@ -0,0 +1,94 @@
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import BooleanField, Case, FloatField, Q, Value, When
+from django.db.models import Subquery
+from django.db.models.expressions import RawSQL
+
+from .models import ProductCategory
+
+
+# Должно совпадать с выражением индекса foodcartapp_product_search,
+# иначе PostgreSQL не станет его использовать
+SEARCH_DOCUMENT = (
+    "to_tsvector('russian', foodcartapp_product.name || ' ' || "
+    "foodcartapp_product.description)"
+)
+SEARCH_QUERY = "plainto_tsquery('russian', %s)"
+
+
+def normalize_query(query):
+    return ' '.join(query.split())
+
+
+def search_products_postgresql(products, query):
+    return (
+        products
+            .annotate(
+                matches=RawSQL(f'{SEARCH_DOCUMENT} @@ {SEARCH_QUERY}', [query],
+                               output_field=BooleanField()),
+                rank=RawSQL(f'ts_rank({SEARCH_DOCUMENT}, {SEARCH_QUERY})', [query],
+                            output_field=FloatField()) +
+                TrigramSimilarity('name', query),
+            )
+            .filter(
+                Q(matches=True) |
+                Q(name__icontains=query) |
+                # Подзапрос вместо LEFT JOIN: категории ищутся по своему
+                # trigram-индексу, а не проверяются для каждого товара
+                Q(category_id__in=Subquery(
+                    ProductCategory.objects
+                        .filter(name__icontains=query)
+                        .values('id')
+                ))
+            )
+            .order_by('-rank', 'name', 'id')
+    )
+
+
+def rank_products_casefold(products, query):
+    # SQLite меняет регистр только у латиницы, поэтому кириллицу
+    # приходится сравнивать в Python
+    words = query.casefold().split()
+    ranked = []
+    for product_id, name, category_name, description in products.values_list(
+            'id', 'name', 'category__name', 'description'):
+        name = name.casefold()
+        text = ' '.join([name, (category_name or '').casefold(),
+                         description.casefold()])
+        if not all(word in text for word in words):
+            continue
+        rank = (
+            all(word in name for word in words),
+            name.startswith(words[0]),
+            -len(name),
+        )
+        ranked.append((rank, product_id))
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    return [product_id for _, product_id in ranked]
+
+
+def search_products_casefold(products, query):
+    product_ids = rank_products_casefold(products, query)
+    positions = [
+        When(id=product_id, then=Value(position))
+        for position, product_id in enumerate(product_ids)
+    ]
+    products = products.filter(id__in=product_ids)
+    if positions:
+        products = products.order_by(Case(*positions))
+    return products
+
+
+def search_products(products, query):
+    """Ищет товары по названию, категории и описанию.
+
+    Возвращает QuerySet, отсортированный от самых подходящих товаров.
+    На PostgreSQL поиск идёт по полнотекстовому и триграммным индексам,
+    на остальных базах — перебором в Python.
+    """
+    query = normalize_query(query)
+    if not query:
+        return products.none()
+    if connection.vendor == 'postgresql':
+        return search_products_postgresql(products, query)
+    return search_products_casefold(products, query)
@@ -0,0 +1,81 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from place.geocoding import enqueue_addresses
+from place.models import Place
+from .images import (
+    delete_image_variants, has_actual_variants, make_image_variants,
+)
+from .models import (
+    Banner, Order, OrderProduct, Product, ProductCategory, Restaurant,
+    RestaurantMenuItem,
+)
+from .versions import (
+    BANNERS, CATALOG, MENU, RESTAURANT_LOCATIONS, bump_version_on_commit,
+)
+
+
+@receiver(post_save, sender=Restaurant)
+def enqueue_restaurant_address(sender, instance, **kwargs):
+    enqueue_addresses([instance.address])
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def reset_restaurant_locations(sender, **kwargs):
+    bump_version_on_commit(RESTAURANT_LOCATIONS)
+
+
+@receiver(post_save, sender=Place)
+@receiver(post_delete, sender=Place)
+def reset_restaurant_place(sender, instance, **kwargs):
+    if Restaurant.objects.filter(address=instance.address).exists():
+        bump_version_on_commit(RESTAURANT_LOCATIONS)
+
+
+@receiver(post_save, sender=Product)
+def update_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or has_actual_variants(instance):
+        return
+    stale_variants = instance.image_variants
+    stale_source = stale_variants.get('source')
+    # Копии старой картинки удаляются до создания новых: имена копий
+    # зависят только от имени файла без расширения и могут совпасть.
+    # Одна картинка бывает у многих товаров, и тогда копии ещё нужны
+    if stale_source and not Product.objects.filter(image=stale_source).exists():
+        delete_image_variants(instance.image.storage, stale_variants)
+    instance.image_variants = {}
+    if instance.image:
+        instance.image_variants = make_image_variants(instance.image)
+    if instance.image_variants != stale_variants:
+        Product.objects.filter(pk=instance.pk).update(
+            image_variants=instance.image_variants
+        )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def reset_catalog(sender, **kwargs):
+    bump_version_on_commit(CATALOG)
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def reset_menu(sender, **kwargs):
+    bump_version_on_commit(MENU)
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def reset_banners(sender, **kwargs):
+    bump_version_on_commit(BANNERS)
+
+
+@receiver(post_save, sender=OrderProduct)
+@receiver(post_delete, sender=OrderProduct)
+def update_order_total_price(sender, instance, **kwargs):
+    Order.objects.filter(pk=instance.order_id).update_total_price()
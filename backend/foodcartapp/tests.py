@@ -0,0 +1,1109 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+import brotli
+import requests
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from place.models import GeocodingTask, Place
+from .admin import OrderAdmin
+from .availability import RestaurantAvailability
+from .availability import get_availability, set_availability
+from .banners import build_banners_payload
+from .claims import claim_orders, release_orders
+from .dispatch import assign_restaurants, get_restaurant_loads
+from .dispatch import get_skipped_order_ids, save_assignments
+from .management.commands.loadtest import LoadTest, summarize
+from .models import Banner, IdempotencyKey, Order, OrderProduct
+from .models import Product, ProductCategory, Restaurant, RestaurantMenuItem
+from .search import search_products
+from .versions import MENU, RESTAURANT_LOCATIONS, bump_version
+
+
+def create_catalog(products=3, restaurants=2):
+    category = ProductCategory.objects.create(name='Бургеры')
+    products = [
+        Product.objects.create(name=f'Бургер {number}', category=category,
+                               price=Decimal(100 * number))
+        for number in range(1, products + 1)
+    ]
+    restaurants = [
+        Restaurant.objects.create(name=f'Star Burger {number}',
+                                  address=f'Москва, улица, {number}')
+        for number in range(1, restaurants + 1)
+    ]
+    return products, restaurants
+
+
+def make_order_data(products, address='Москва, Тверская, 1'):
+    return {
+        'products': [
+            {'product': product.id, 'quantity': quantity}
+            for quantity, product in enumerate(products, start=1)
+        ],
+        'firstname': 'Иван',
+        'lastname': 'Петров',
+        'phonenumber': '+79161234567',
+        'address': address,
+    }
+
+
+class RegisterOrdersTest(TestCase):
+    def setUp(self):
+        self.products, _ = create_catalog()
+
+    def post(self, data):
+        return self.client.post(reverse('foodcartapp:register_orders'), data,
+                                content_type='application/json')
+
+    def test_valid_orders_are_created_in_bulk(self):
+        orders_data = [
+            make_order_data(self.products[:2], address='Москва, Тверская, 1'),
+            make_order_data(self.products[1:], address='Москва, Арбат, 2'),
+        ]
+
+        # Без RETURNING у bulk_create заказы вставляются по одному
+        order_inserts = 1
+        if not connection.features.can_return_rows_from_bulk_insert:
+            order_inserts = len(orders_data)
+        with self.assertNumQueries(5 + order_inserts):
+            response = self.post(orders_data)
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertEqual([result['status'] for result in results],
+                         ['created', 'created'])
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(OrderProduct.objects.count(), 4)
+        first_order = Order.objects.get(id=results[0]['order']['id'])
+        # 100 × 1 + 200 × 2
+        self.assertEqual(first_order.total_price, Decimal(500))
+        self.assertEqual(
+            GeocodingTask.objects
+                .filter(address__in=['Москва, Тверская, 1', 'Москва, Арбат, 2'])
+                .count(),
+            2,
+        )
+
+    def test_invalid_orders_are_reported_separately(self):
+        invalid_order = make_order_data(self.products[:1])
+        invalid_order['products'][0]['product'] = 999999
+        orders_data = [
+            make_order_data(self.products[:1]),
+            invalid_order,
+            {'products': []},
+        ]
+
+        response = self.post(orders_data)
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertEqual([result['status'] for result in results],
+                         ['created', 'error', 'error'])
+        self.assertIn('products', results[1]['errors'])
+        self.assertIn('firstname', results[2]['errors'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_payload_must_be_a_list(self):
+        response = self.post(make_order_data(self.products))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    @override_settings(ORDER_BATCH_MAX_SIZE=1)
+    def test_batch_size_is_limited(self):
+        response = self.post([make_order_data(self.products)] * 2)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class IdempotentOrderTest(TestCase):
+    def setUp(self):
+        self.products, _ = create_catalog()
+        self.order_data = make_order_data(self.products)
+
+    def post(self, data, key):
+        return self.client.post(reverse('foodcartapp:register_order'), data,
+                                content_type='application/json',
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_returns_the_same_order(self):
+        first_response = self.post(self.order_data, 'key-1')
+        retry_response = self.post(self.order_data, 'key-1')
+
+        self.assertEqual(first_response.status_code, 200)
+        self.assertEqual(retry_response.status_code, 200)
+        self.assertEqual(retry_response.json(), first_response.json())
+        self.assertEqual(Order.objects.count(), 1)
+        key = IdempotencyKey.objects.get(key='key-1')
+        self.assertEqual(key.order_id, first_response.json()['id'])
+
+    def test_other_key_creates_another_order(self):
+        self.post(self.order_data, 'key-1')
+        self.post(self.order_data, 'key-2')
+
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_key_reused_for_other_order_is_rejected(self):
+        self.post(self.order_data, 'key-1')
+        other_order_data = make_order_data(self.products[:1])
+
+        response = self.post(other_order_data, 'key-1')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_key_can_be_used_again(self):
+        self.post(self.order_data, 'key-1')
+        IdempotencyKey.objects.update(
+            created_at=timezone.now() - settings.IDEMPOTENCY_KEY_TTL - timedelta(minutes=1)
+        )
+
+        response = self.post(self.order_data, 'key-1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.get().order_id,
+                         response.json()['id'])
+
+    def test_invalid_order_does_not_use_the_key(self):
+        response = self.post({'products': []}, 'key-1')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_empty_key_is_rejected(self):
+        response = self.post(self.order_data, ' ')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class ClaimOrdersTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.manager = User.objects.create_user('manager', is_staff=True)
+        self.other_manager = User.objects.create_user('other', is_staff=True)
+        self.orders = [
+            Order.objects.create(firstname='Иван', lastname='Петров',
+                                 phonenumber='+79161234567',
+                                 address=f'Москва, Тверская, {number}')
+            for number in range(5)
+        ]
+
+    def test_managers_claim_disjoint_orders(self):
+        first_ids = claim_orders(self.manager, 3)
+        second_ids = claim_orders(self.other_manager, 3)
+
+        self.assertEqual(first_ids, [order.id for order in self.orders[:3]])
+        self.assertEqual(second_ids, [order.id for order in self.orders[3:]])
+        self.assertEqual(claim_orders(self.manager, 3), [])
+
+    def test_expired_claim_can_be_taken_over(self):
+        claim_orders(self.manager, 5)
+        Order.objects.filter(id=self.orders[0].id).update(
+            claimed_at=timezone.now() - settings.ORDER_CLAIM_TIMEOUT - timedelta(minutes=1)
+        )
+
+        claimed_ids = claim_orders(self.other_manager, 5)
+
+        self.assertEqual(claimed_ids, [self.orders[0].id])
+        self.assertEqual(
+            Order.objects.claimed_by_manager(self.manager).count(), 4
+        )
+
+    def test_processed_orders_are_not_claimed(self):
+        Order.objects.exclude(id=self.orders[0].id).update(
+            order_status='Обработанный'
+        )
+
+        self.assertEqual(claim_orders(self.manager, 5), [self.orders[0].id])
+
+    def test_release_orders(self):
+        claim_orders(self.manager, 2)
+        claim_orders(self.other_manager, 2)
+
+        released_count = release_orders(self.manager)
+
+        self.assertEqual(released_count, 2)
+        self.assertFalse(Order.objects.claimed_by_manager(self.manager).exists())
+        self.assertEqual(
+            Order.objects.claimed_by_manager(self.other_manager).count(), 2
+        )
+        self.assertEqual(claim_orders(self.manager, 5),
+                         [order.id for order in self.orders[:2]] +
+                         [self.orders[4].id])
+
+
+class OrderAdminClaimTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.manager = User.objects.create_superuser('manager')
+        self.other_manager = User.objects.create_superuser('other')
+        self.orders = [
+            Order.objects.create(firstname='Иван', lastname='Петров',
+                                 phonenumber='+79161234567',
+                                 address=f'Москва, Тверская, {number}')
+            for number in range(3)
+        ]
+        self.client.force_login(self.manager)
+
+    def test_saving_order_does_not_claim_it(self):
+        order = self.orders[0]
+        request = RequestFactory().post('/')
+        request.user = self.manager
+        form = mock.Mock(changed_data=['order_status'])
+        order.order_status = 'Обработанный'
+
+        OrderAdmin(Order, admin.site).save_model(request, order, form, True)
+
+        order.refresh_from_db()
+        self.assertEqual(order.order_status, 'Обработанный')
+        self.assertIsNone(order.claimed_by)
+        self.assertIsNone(order.claimed_at)
+
+    def test_action_claims_only_free_selected_orders(self):
+        claim_orders(self.other_manager, 1)
+
+        response = self.client.post(
+            reverse('admin:foodcartapp_order_changelist'),
+            {'action': 'claim_selected_orders',
+             '_selected_action': [order.id for order in self.orders[:2]]},
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            list(Order.objects.claimed_by_manager(self.manager)
+                 .values_list('id', flat=True)),
+            [self.orders[1].id],
+        )
+        self.assertEqual(
+            list(Order.objects.claimed_by_manager(self.other_manager)
+                 .values_list('id', flat=True)),
+            [self.orders[0].id],
+        )
+
+
+class RestaurantAvailabilityTest(TestCase):
+    def test_restaurants_having_all_products(self):
+        availability = RestaurantAvailability([
+            (1, 10), (1, 20), (2, 10), (3, 20), (3, 30),
+        ])
+
+        self.assertEqual(availability.get_restaurant_ids([1]), [10, 20])
+        self.assertEqual(availability.get_restaurant_ids([1, 3]), [20])
+        self.assertEqual(availability.get_restaurant_ids([1, 2]), [10])
+        self.assertEqual(availability.get_restaurant_ids([2, 3]), [])
+        self.assertEqual(availability.get_restaurant_ids([4]), [])
+        self.assertEqual(availability.get_restaurant_ids([]), [])
+        self.assertTrue(availability.is_available(30, 3))
+        self.assertFalse(availability.is_available(10, 3))
+        self.assertFalse(availability.is_available(40, 1))
+
+    def test_build_skips_unavailable_items(self):
+        products, restaurants = create_catalog(products=2)
+        RestaurantMenuItem.objects.create(restaurant=restaurants[0],
+                                          product=products[0])
+        RestaurantMenuItem.objects.create(restaurant=restaurants[1],
+                                          product=products[0],
+                                          availability=False)
+
+        availability = RestaurantAvailability.build()
+
+        self.assertEqual(availability.get_restaurant_ids([products[0].id]),
+                         [restaurants[0].id])
+        self.assertEqual(availability.get_restaurant_ids([products[1].id]), [])
+
+
+class SetAvailabilityTest(TestCase):
+    def setUp(self):
+        self.products, self.restaurants = create_catalog(products=2)
+        RestaurantMenuItem.objects.create(restaurant=self.restaurants[0],
+                                          product=self.products[0])
+        # Сигналы поднимают версию меню только после коммита,
+        # а TestCase транзакцию не коммитит
+        bump_version(MENU)
+
+    def test_disable_and_enable_items(self):
+        restaurant, product = self.restaurants[0], self.products[0]
+        self.assertTrue(get_availability().is_available(restaurant.id, product.id))
+
+        set_availability([(restaurant.id, product.id)], False)
+
+        self.assertFalse(get_availability().is_available(restaurant.id, product.id))
+        self.assertFalse(RestaurantMenuItem.objects.get().availability)
+
+        set_availability([(restaurant.id, product.id)], True)
+
+        self.assertTrue(get_availability().is_available(restaurant.id, product.id))
+
+    def test_enabling_creates_missing_items(self):
+        cells = [(restaurant.id, product.id)
+                 for restaurant in self.restaurants
+                 for product in self.products]
+
+        set_availability(cells, True)
+
+        self.assertEqual(RestaurantMenuItem.objects.available().count(), 4)
+        availability = get_availability()
+        self.assertTrue(all(availability.is_available(*cell) for cell in cells))
+
+    def test_disabling_does_not_create_items(self):
+        set_availability([(self.restaurants[1].id, self.products[1].id)], False)
+
+        self.assertEqual(RestaurantMenuItem.objects.count(), 1)
+
+    def test_availability_is_cached_until_menu_changes(self):
+        availability = get_availability()
+        # update() мимо set_availability не поднимает версию меню
+        RestaurantMenuItem.objects.update(availability=False)
+
+        self.assertIs(get_availability(), availability)
+
+        bump_version(MENU)
+
+        self.assertIsNot(get_availability(), availability)
+        self.assertEqual(
+            get_availability().get_restaurant_ids([self.products[0].id]), []
+        )
+
+
+class MenuRoundTripTest(TestCase):
+    def setUp(self):
+        self.products, self.restaurants = create_catalog()
+        RestaurantMenuItem.objects.bulk_create([
+            RestaurantMenuItem(restaurant=restaurant, product=product,
+                               availability=product != self.products[0])
+            for restaurant in self.restaurants
+            for product in self.products
+        ])
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def get_catalog(self):
+        products = list(
+            Product.objects
+                .order_by('id')
+                .values_list('id', 'name', 'category__name', 'price',
+                             'special_status', 'description')
+        )
+        menu_items = list(
+            RestaurantMenuItem.objects
+                .order_by('restaurant_id', 'product_id')
+                .values_list('restaurant_id', 'product_id', 'availability')
+        )
+        return products, menu_items
+
+    def export_and_import(self, extension):
+        products_path = os.path.join(self.directory.name, f'products.{extension}')
+        menu_path = os.path.join(self.directory.name, f'menu.{extension}')
+        call_command('export_menu', 'products', output=products_path)
+        call_command('export_menu', 'menu', output=menu_path)
+
+        Product.objects.all().delete()
+        ProductCategory.objects.all().delete()
+
+        output = StringIO()
+        call_command('import_menu', 'products', products_path, batch_size=2,
+                     stdout=output, stderr=StringIO())
+        call_command('import_menu', 'menu', menu_path, batch_size=2,
+                     stdout=output, stderr=StringIO())
+        return output.getvalue()
+
+    def test_round_trip_into_empty_catalog(self):
+        for extension in ['csv', 'jsonl']:
+            with self.subTest(extension=extension):
+                catalog = self.get_catalog()
+
+                output = self.export_and_import(extension)
+
+                self.assertEqual(self.get_catalog(), catalog)
+                self.assertIn('Создано: 3, обновлено: 0, пропущено: 0', output)
+                self.assertIn('Создано: 6, обновлено: 0, пропущено: 0', output)
+
+    def test_products_without_id_get_new_ids(self):
+        path = os.path.join(self.directory.name, 'products.jsonl')
+        with open(path, 'w') as file:
+            file.write('{"id": 100, "name": "С id", "price": 10}\n')
+            file.write('{"name": "Без id", "price": 20}\n')
+
+        call_command('import_menu', 'products', path,
+                     stdout=StringIO(), stderr=StringIO())
+
+        self.assertTrue(Product.objects.filter(id=100, name='С id').exists())
+        new_product = Product.objects.get(name='Без id')
+        self.assertNotIn(new_product.id,
+                         [product.id for product in self.products] + [100])
+
+    def test_skipped_lines_are_reported(self):
+        path = os.path.join(self.directory.name, 'menu.csv')
+        restaurant, product = self.restaurants[0], self.products[0]
+        with open(path, 'w') as file:
+            file.write('restaurant,product,availability\n')
+            file.write(f'{restaurant.id},{product.id},1\n')
+            file.write(f'{restaurant.id},999999,1\n')
+            file.write(f'999999,{product.id},0\n')
+
+        output = StringIO()
+        call_command('import_menu', 'menu', path,
+                     stdout=output, stderr=StringIO())
+
+        self.assertIn('обновлено: 1, пропущено: 2', output.getvalue())
+        self.assertIn('Пропущены строки: 3, 4', output.getvalue())
+
+
+def use_temporary_media(test_case):
+    media_root = tempfile.mkdtemp()
+    test_case.addCleanup(shutil.rmtree, media_root)
+    media_settings = test_case.settings(MEDIA_ROOT=media_root)
+    media_settings.enable()
+    test_case.addCleanup(media_settings.disable)
+
+
+class ImageVariantsTest(TestCase):
+    def setUp(self):
+        use_temporary_media(self)
+
+    def save_image(self, name):
+        content = BytesIO()
+        Image.new('RGB', (500, 300), 'red').save(content, 'PNG')
+        return default_storage.save(name, ContentFile(content.getvalue()))
+
+    def get_variant_names(self, product):
+        return [
+            name
+            for variant in product.image_variants['sizes'].values()
+            for key, name in variant.items() if key not in ('width', 'height')
+        ]
+
+    def test_replaced_image_variants_are_deleted(self):
+        product = Product.objects.create(name='Бургер', price=Decimal(100),
+                                         image=self.save_image('old.png'))
+        old_names = self.get_variant_names(product)
+        self.assertTrue(all(default_storage.exists(name) for name in old_names))
+
+        product.image = self.save_image('new.png')
+        product.save()
+
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants['source'], product.image.name)
+        self.assertFalse(any(default_storage.exists(name) for name in old_names))
+        self.assertTrue(all(default_storage.exists(name)
+                            for name in self.get_variant_names(product)))
+
+    def test_shared_image_variants_are_kept(self):
+        image_name = self.save_image('shared.png')
+        product = Product.objects.create(name='Бургер', price=Decimal(100),
+                                         image=image_name)
+        Product.objects.create(name='Чизбургер', price=Decimal(100),
+                               image=image_name)
+        old_names = self.get_variant_names(product)
+
+        product.image = self.save_image('other.png')
+        product.save()
+
+        self.assertTrue(all(default_storage.exists(name) for name in old_names))
+
+    def test_unreadable_images_are_reported(self):
+        product = Product.objects.create(name='Бургер', price=Decimal(100),
+                                         image=self.save_image('burger.png'))
+        missing_product = Product.objects.create(name='Чизбургер',
+                                                 price=Decimal(100))
+        Product.objects.filter(pk=missing_product.pk).update(image='missing.png')
+        Product.objects.filter(pk=product.pk).update(image_variants={})
+
+        output, errors = StringIO(), StringIO()
+        with self.assertLogs('foodcartapp.images', 'ERROR'):
+            call_command('generate_image_variants', stdout=output, stderr=errors)
+
+        self.assertIn('Обновлено товаров: 1', output.getvalue())
+        self.assertIn(f'id: {missing_product.pk}', errors.getvalue())
+        missing_product.refresh_from_db()
+        self.assertEqual(missing_product.image_variants, {})
+
+
+def create_banner(title, **kwargs):
+    return Banner.objects.create(title=title, image=f'banners/{title}.jpg',
+                                 **kwargs)
+
+
+class BannersTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+
+    def get(self, **headers):
+        return self.client.get(reverse('foodcartapp:banners_list_api'),
+                               **headers)
+
+    def test_only_active_banners_are_shown(self):
+        create_banner('always')
+        create_banner('started', active_from=self.now - timedelta(days=1))
+        create_banner('finished', active_until=self.now - timedelta(days=1))
+        create_banner('scheduled', active_from=self.now + timedelta(days=1))
+        create_banner('running', active_from=self.now - timedelta(days=1),
+                      active_until=self.now + timedelta(days=1))
+
+        response = self.get()
+
+        self.assertEqual([banner['title'] for banner in response.json()],
+                         ['always', 'started', 'running'])
+
+    def test_payload_expires_at_next_window_change(self):
+        create_banner('always')
+        create_banner('scheduled', active_from=self.now + timedelta(hours=1))
+        create_banner('running', active_until=self.now + timedelta(hours=2))
+
+        _, timeout = build_banners_payload()
+
+        self.assertAlmostEqual(timeout, 60 * 60, delta=5)
+
+    def test_payload_without_windows_uses_catalog_timeout(self):
+        create_banner('always')
+
+        _, timeout = build_banners_payload()
+
+        self.assertEqual(timeout, settings.CATALOG_CACHE_TIMEOUT)
+
+    def test_cached_payload_needs_no_queries(self):
+        create_banner('always')
+        self.get()
+
+        with self.assertNumQueries(0):
+            response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_encoding_follows_accept_encoding(self):
+        create_banner('always')
+        identity = self.get().content
+
+        cases = [
+            ('gzip, deflate, br', 'br', brotli.decompress),
+            ('gzip', 'gzip', gzip.decompress),
+            ('', None, bytes),
+        ]
+        for accept_encoding, encoding, decompress in cases:
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.get(HTTP_ACCEPT_ENCODING=accept_encoding)
+
+                self.assertEqual(response.get('Content-Encoding'), encoding)
+                self.assertIn('Accept-Encoding', response['Vary'])
+                self.assertEqual(decompress(response.content), identity)
+
+    def test_matching_etag_returns_not_modified(self):
+        create_banner('always')
+        etag = self.get()['ETag']
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+
+class BannersInvalidationTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def get_titles(self):
+        response = self.client.get(reverse('foodcartapp:banners_list_api'))
+        return [banner['title'] for banner in json.loads(response.content)]
+
+    def test_saved_banner_replaces_cached_payload(self):
+        banner = create_banner('old')
+        self.assertEqual(self.get_titles(), ['old'])
+
+        banner.title = 'new'
+        banner.save()
+
+        self.assertEqual(self.get_titles(), ['new'])
+
+    def test_deleted_banner_disappears(self):
+        create_banner('first')
+        second_banner = create_banner('second')
+        self.assertEqual(self.get_titles(), ['first', 'second'])
+
+        second_banner.delete()
+
+        self.assertEqual(self.get_titles(), ['first'])
+
+
+class CreateDefaultBannersTest(TestCase):
+    def setUp(self):
+        use_temporary_media(self)
+
+    def test_banners_are_created_once(self):
+        call_command('create_default_banners', stdout=StringIO())
+        call_command('create_default_banners', stdout=StringIO())
+
+        self.assertEqual(
+            list(Banner.objects.values_list('title', 'image')),
+            [('Burger', 'banners/burger.jpg'), ('Spices', 'banners/food.jpg'),
+             ('New York', 'banners/tasty.jpg')],
+        )
+        self.assertTrue(all(default_storage.exists(banner.image.name)
+                            for banner in Banner.objects.all()))
+
+    @override_settings(STATICFILES_DIRS=[])
+    def test_missing_image_is_an_error(self):
+        with self.assertRaises(CommandError):
+            call_command('create_default_banners', stdout=StringIO())
+
+        self.assertFalse(Banner.objects.exists())
+
+
+class AssignRestaurantsTest(TestCase):
+    def test_nearest_restaurant_is_chosen(self):
+        assignments = assign_restaurants({1: [(10, 1.0), (20, 2.0)]},
+                                         Counter(), load_penalty=1)
+
+        self.assertEqual(assignments, {1: 10})
+
+    def test_load_moves_orders_to_farther_restaurant(self):
+        candidates = {
+            order_id: [(10, 1.0), (20, 2.5)] for order_id in [1, 2, 3]
+        }
+
+        assignments = assign_restaurants(candidates, Counter(), load_penalty=1)
+
+        # Третий заказ в ресторане 10 обошёлся бы в 1 + 2 км
+        self.assertEqual(assignments, {1: 10, 2: 10, 3: 20})
+
+    def test_existing_loads_are_counted(self):
+        assignments = assign_restaurants({1: [(10, 1.0), (20, 2.0)]},
+                                         Counter({10: 2}), load_penalty=1)
+
+        self.assertEqual(assignments, {1: 20})
+
+    def test_orders_with_fewer_candidates_go_first(self):
+        candidates = {
+            1: [(10, 1.0), (20, 1.5)],
+            2: [(10, 1.2)],
+        }
+
+        assignments = assign_restaurants(candidates, Counter(), load_penalty=10)
+
+        self.assertEqual(assignments, {1: 20, 2: 10})
+
+    def test_orders_without_candidates_are_skipped(self):
+        loads = Counter({10: 1})
+
+        assignments = assign_restaurants({1: [], 2: [(10, 1.0)]}, loads,
+                                         load_penalty=1)
+
+        self.assertEqual(assignments, {2: 10})
+        self.assertEqual(loads, Counter({10: 1}))
+
+
+class DispatchOrdersTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products, self.restaurants = create_catalog(products=2)
+        for number, restaurant in enumerate(self.restaurants):
+            Place.objects.create(address=restaurant.address,
+                                 lat=55.75, lon=37.60 + number * 0.1)
+            RestaurantMenuItem.objects.create(restaurant=restaurant,
+                                              product=self.products[0])
+        Place.objects.create(address='Москва, Тверская, 1', lat=55.75, lon=37.61)
+        # Сигналы поднимают версии только после коммита
+        bump_version(MENU)
+        bump_version(RESTAURANT_LOCATIONS)
+
+    def create_order(self, products, address='Москва, Тверская, 1', **kwargs):
+        order = Order.objects.create(firstname='Иван', lastname='Петров',
+                                     phonenumber='+79161234567',
+                                     address=address, **kwargs)
+        for product in products:
+            OrderProduct.objects.create(order=order, product=product,
+                                        quantity=1, price=product.price)
+        return order
+
+    def dispatch(self):
+        output = StringIO()
+        call_command('dispatch_orders', once=True, stdout=output)
+        return output.getvalue()
+
+    def test_orders_get_nearest_restaurant(self):
+        order = self.create_order(self.products[:1])
+
+        output = self.dispatch()
+
+        order.refresh_from_db()
+        self.assertEqual(order.restaurant, self.restaurants[0])
+        self.assertTrue(order.auto_assigned)
+        self.assertIn('Назначено заказов: 1', output)
+
+    def test_orders_nobody_can_cook_wait_for_menu_change(self):
+        order = self.create_order(self.products)
+        self.dispatch()
+        self.assertIn(order.id, get_skipped_order_ids())
+        RestaurantMenuItem.objects.create(restaurant=self.restaurants[1],
+                                          product=self.products[1])
+
+        self.dispatch()
+
+        order.refresh_from_db()
+        self.assertIsNone(order.restaurant)
+
+        bump_version(MENU)
+        self.dispatch()
+
+        order.refresh_from_db()
+        self.assertEqual(order.restaurant, self.restaurants[1])
+
+    def test_orders_without_coordinates_are_not_read(self):
+        order = self.create_order(self.products[:1], address='Москва, Арбат, 2')
+
+        self.dispatch()
+
+        order.refresh_from_db()
+        self.assertIsNone(order.restaurant)
+
+    def test_processed_and_assigned_orders_are_left_alone(self):
+        processed_order = self.create_order(self.products[:1],
+                                            order_status='Обработанный')
+        manual_order = self.create_order(self.products[:1],
+                                         restaurant=self.restaurants[1])
+
+        self.dispatch()
+
+        processed_order.refresh_from_db()
+        manual_order.refresh_from_db()
+        self.assertIsNone(processed_order.restaurant)
+        self.assertEqual(manual_order.restaurant, self.restaurants[1])
+        self.assertFalse(manual_order.auto_assigned)
+
+    def test_order_taken_by_manager_is_not_saved(self):
+        first_order = self.create_order(self.products[:1])
+        second_order = self.create_order(self.products[:1])
+        # Менеджер выбрал ресторан, пока диспетчер считал
+        Order.objects.filter(id=second_order.id).update(
+            restaurant=self.restaurants[1]
+        )
+
+        saved = save_assignments({first_order.id: self.restaurants[0].id,
+                                  second_order.id: self.restaurants[0].id})
+
+        self.assertEqual(saved, {first_order.id: self.restaurants[0].id})
+        second_order.refresh_from_db()
+        self.assertEqual(second_order.restaurant, self.restaurants[1])
+
+    def test_loads_count_only_orders_in_progress(self):
+        restaurant = self.restaurants[0]
+        self.create_order([], restaurant=restaurant)
+        self.create_order([], restaurant=restaurant, delivered_at=timezone.now())
+        self.create_order(
+            [], restaurant=restaurant,
+            registrated_at=timezone.now() - settings.DISPATCH_LOAD_WINDOW
+            - timedelta(minutes=1),
+        )
+
+        self.assertEqual(get_restaurant_loads(), Counter({restaurant.id: 1}))
+
+
+class ProductListCacheTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.products, self.restaurants = create_catalog(products=2)
+        # С готовыми image_variants сохранение товара не трогает файлы
+        Product.objects.update(image='burger.jpg', image_variants={
+            'source': 'burger.jpg', 'sizes': {},
+        })
+        self.menu_item = RestaurantMenuItem.objects.create(
+            restaurant=self.restaurants[0], product=self.products[0],
+        )
+
+    def get(self, **headers):
+        return self.client.get(reverse('foodcartapp:product_list_api'),
+                               **headers)
+
+    def test_first_response_has_validators(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'])
+        self.assertTrue(response['Last-Modified'])
+        self.assertEqual([product['id'] for product in response.json()],
+                         [self.products[0].id])
+
+    def test_revalidation_needs_no_queries(self):
+        etag = self.get()['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_product_change_is_visible_after_commit(self):
+        etag = self.get()['ETag']
+        product = Product.objects.get(id=self.products[0].id)
+
+        with transaction.atomic():
+            product.name = 'Новый бургер'
+            product.save()
+            self.assertEqual(self.get()['ETag'], etag)
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['name'], 'Новый бургер')
+
+    def test_menu_change_is_visible_after_commit(self):
+        etag = self.get()['ETag']
+
+        with transaction.atomic():
+            RestaurantMenuItem.objects.create(restaurant=self.restaurants[1],
+                                              product=self.products[1])
+            self.assertEqual(self.get()['ETag'], etag)
+
+        response = self.get()
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_rolled_back_change_keeps_etag(self):
+        etag = self.get()['ETag']
+
+        try:
+            with transaction.atomic():
+                self.menu_item.delete()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class OrderTotalPriceTest(TestCase):
+    def setUp(self):
+        self.products, _ = create_catalog(products=2, restaurants=0)
+        self.order = Order.objects.create(firstname='Иван', lastname='Петров',
+                                          phonenumber='+79161234567',
+                                          address='Москва, Тверская, 1')
+
+    def add_product(self, product, quantity, order=None):
+        return OrderProduct.objects.create(order=order or self.order,
+                                           product=product, quantity=quantity,
+                                           price=product.price)
+
+    def get_total_price(self, order=None):
+        return Order.objects.get(pk=(order or self.order).pk).total_price
+
+    def check_totals(self, **options):
+        output = StringIO()
+        call_command('check_order_totals', stdout=output, **options)
+        return output.getvalue()
+
+    def test_adding_products_updates_total(self):
+        self.add_product(self.products[0], 2)
+        self.add_product(self.products[1], 1)
+
+        self.assertEqual(self.get_total_price(), Decimal(400))
+
+    def test_changing_product_updates_total(self):
+        order_product = self.add_product(self.products[0], 1)
+
+        order_product.quantity = 3
+        order_product.price = Decimal('150.50')
+        order_product.save()
+
+        self.assertEqual(self.get_total_price(), Decimal('451.50'))
+
+    def test_deleting_products_updates_total(self):
+        first = self.add_product(self.products[0], 1)
+        second = self.add_product(self.products[1], 1)
+
+        first.delete()
+        self.assertEqual(self.get_total_price(), Decimal(200))
+
+        second.delete()
+        self.assertEqual(self.get_total_price(), Decimal(0))
+
+    def test_other_orders_are_not_touched(self):
+        other_order = Order.objects.create(firstname='Пётр', lastname='Иванов',
+                                           phonenumber='+79161234568',
+                                           address='Москва, Тверская, 2')
+        self.add_product(self.products[0], 1, order=other_order)
+
+        self.add_product(self.products[1], 2)
+
+        self.assertEqual(self.get_total_price(other_order), Decimal(100))
+        self.assertEqual(self.get_total_price(), Decimal(400))
+
+    def test_check_reports_drift_without_fix(self):
+        self.add_product(self.products[0], 1)
+        Order.objects.filter(pk=self.order.pk).update(total_price=Decimal(1))
+
+        output = self.check_totals()
+
+        self.assertIn(f'Заказ {self.order.pk}: сохранено 1', output)
+        self.assertIn('Заказов с расхождениями: 1', output)
+        self.assertEqual(self.get_total_price(), Decimal(1))
+
+    def test_check_fixes_drift(self):
+        self.add_product(self.products[0], 2)
+        empty_order = Order.objects.create(firstname='Пётр', lastname='Иванов',
+                                           phonenumber='+79161234568',
+                                           address='Москва, Тверская, 2')
+        Order.objects.update(total_price=Decimal(1))
+
+        output = self.check_totals(fix=True, chunk_size=1)
+
+        self.assertIn('Исправлено заказов: 2', output)
+        self.assertEqual(self.get_total_price(), Decimal(200))
+        self.assertEqual(self.get_total_price(empty_order), Decimal(0))
+        self.assertIn('Расхождений нет', self.check_totals())
+
+
+class ProductSearchTest(TestCase):
+    def setUp(self):
+        self.restaurant = Restaurant.objects.create(name='Star Burger',
+                                                    address='Москва, улица, 1')
+        self.burgers = ProductCategory.objects.create(name='Бургеры')
+        self.drinks = ProductCategory.objects.create(name='Напитки')
+        self.url = reverse('foodcartapp:product_search_api')
+
+    def create_product(self, name, category=None, description='',
+                       available=True):
+        product = Product.objects.create(
+            name=name, category=category or self.burgers,
+            description=description, price=Decimal(100),
+            # С готовыми image_variants сохранение товара не трогает файлы
+            image='burger.jpg',
+            image_variants={'source': 'burger.jpg', 'sizes': {}},
+        )
+        RestaurantMenuItem.objects.create(restaurant=self.restaurant,
+                                          product=product,
+                                          availability=available)
+        return product
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [product['id'] for product in response.json()]
+
+    def test_cyrillic_query_ignores_case(self):
+        cheeseburger = self.create_product('ЧИЗБУРГЕР')
+        self.create_product('Кола', category=self.drinks)
+
+        self.assertEqual(self.search(q='чизбургер'), [cheeseburger.id])
+        self.assertEqual(self.search(q='  Чиз  '), [cheeseburger.id])
+
+    def test_name_matches_go_first(self):
+        by_description = self.create_product('Двойной',
+                                             description='С сыром чеддер')
+        by_name = self.create_product('Сырный')
+        by_prefix = self.create_product('Сыр')
+
+        self.assertEqual(self.search(q='сыр'),
+                         [by_prefix.id, by_name.id, by_description.id])
+
+    def test_all_words_must_match(self):
+        spicy = self.create_product('Острый бургер')
+        self.create_product('Острые крылья')
+
+        self.assertEqual(self.search(q='бургер острый'), [spicy.id])
+
+    def test_category_matches(self):
+        cola = self.create_product('Кола', category=self.drinks)
+        self.create_product('Чизбургер')
+
+        self.assertEqual(self.search(q='напитки'), [cola.id])
+
+    def test_unavailable_products_are_hidden(self):
+        self.create_product('Бургер', available=False)
+
+        self.assertEqual(self.search(q='бургер'), [])
+
+    def test_limit(self):
+        for number in range(settings.PRODUCT_SEARCH_MAX_LIMIT + 1):
+            self.create_product(f'Бургер {number}')
+
+        self.assertEqual(len(self.search(q='бургер', limit=2)), 2)
+        self.assertEqual(len(self.search(q='бургер')),
+                         settings.PRODUCT_SEARCH_MAX_LIMIT)
+
+    def test_invalid_params(self):
+        invalid_params = [
+            {},
+            {'q': ''},
+            {'q': 'бургер', 'limit': 0},
+            {'q': 'бургер', 'limit': 'много'},
+            {'q': 'бургер', 'limit': settings.PRODUCT_SEARCH_MAX_LIMIT + 1},
+        ]
+        for params in invalid_params:
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_blank_query_finds_nothing(self):
+        self.create_product('Бургер')
+
+        self.assertFalse(search_products(Product.objects.all(), '   ').exists())
+
+    @skipUnless(connection.vendor == 'postgresql',
+                'полнотекстовый поиск работает только на PostgreSQL')
+    def test_postgresql_full_text_search(self):
+        cheeseburger = self.create_product('Чизбургер',
+                                           description='Котлета с сырами')
+        cola = self.create_product('Кола', category=self.drinks)
+
+        # Словоформы приводятся к основе русским словарём
+        self.assertEqual(self.search(q='сыр'), [cheeseburger.id])
+        self.assertEqual(self.search(q='ЧИЗБУРГЕР'), [cheeseburger.id])
+        self.assertEqual(self.search(q='напитки'), [cola.id])
+
+
+class LoadTestSummaryTest(SimpleTestCase):
+    def test_errors_are_not_in_latencies(self):
+        summary = summarize([0.01, 0.02, 0.03, 0.04], errors=2, elapsed=2)
+
+        self.assertEqual(summary['requests'], 6)
+        self.assertEqual(summary['errors'], 2)
+        self.assertEqual(summary['error_rate'], 0.3333)
+        self.assertEqual(summary['throughput_rps'], 2)
+        self.assertEqual(summary['latency_ms']['p50'], 20)
+        self.assertEqual(summary['latency_ms']['max'], 40)
+
+    def test_only_errors(self):
+        summary = summarize([], errors=3, elapsed=1)
+
+        self.assertEqual(summary['requests'], 3)
+        self.assertEqual(summary['error_rate'], 1)
+        self.assertIsNone(summary['latency_ms']['p95'])
+
+    def test_client_records_latency_of_successful_requests(self):
+        ok_response = mock.Mock(ok=True)
+        error_response = mock.Mock(ok=False)
+        load_test = LoadTest(base_url='http://testserver', weights={'products': 1},
+                             product_ids=[], deadline=float('inf'),
+                             max_requests=3, max_cart_size=1, timeout=1, seed=0)
+
+        with mock.patch('requests.Session.request', side_effect=[
+                ok_response, error_response, requests.Timeout()]):
+            load_test.run_client(0)
+
+        self.assertEqual(len(load_test.latencies['products']), 1)
+        self.assertEqual(load_test.errors['products'], 2)
@@ -0,0 +1,36 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+CATALOG = 'catalog'
+MENU = 'menu'
+BANNERS = 'banners'
+RESTAURANT_LOCATIONS = 'restaurant_locations'
+
+
+def _get_key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    key = _get_key(name)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(name):
+    version = time.time_ns()
+    cache.set(_get_key(name), version, timeout=None)
+    return version
+
+
+def bump_version_on_commit(name):
+    # Если поднять версию до коммита, параллельный запрос успеет
+    # закешировать старые данные уже под новой версией
+    transaction.on_commit(lambda: bump_version(name))
@@ -1,69 +1,175 @@
-from django.http import JsonResponse
-from django.templatetags.static import static
+import json
+from datetime import datetime, timezone
+
+from django import forms
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from rest_framework.serializers import IntegerField
 from rest_framework.serializers import ModelSerializer
-from django.db import transaction
+from rest_framework.serializers import PrimaryKeyRelatedField
+from rest_framework.serializers import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 
+from place.geocoding import enqueue_addresses
 
+from .banners import get_banners_payload, make_banners_response
+from .idempotency import get_idempotency_key, get_request_hash
+from .idempotency import get_stored_response, reserve_key
+from .images import dump_image_variants
 from .models import Product
 from .models import Order
 from .models import OrderProduct
+from .search import search_products
+from .versions import CATALOG, get_version
 
 
 def banners_list_api(request):
-    # FIXME move data to db?
-    return JsonResponse([
-        {
-            'title': 'Burger',
-            'src': static('burger.jpg'),
-            'text': 'Tasty Burger at your door step',
-        },
-        {
-            'title': 'Spices',
-            'src': static('food.jpg'),
-            'text': 'All Cuisines',
+    return make_banners_response(request, get_banners_payload())
+
+
+def get_catalog_version(request):
+    if not hasattr(request, 'catalog_version'):
+        request.catalog_version = get_version(CATALOG)
+    return request.catalog_version
+
+
+def get_catalog_etag(request):
+    return f'"catalog-{get_catalog_version(request)}"'
+
+
+def get_catalog_last_modified(request):
+    return datetime.fromtimestamp(get_catalog_version(request) / 10 ** 9,
+                                  tz=timezone.utc)
+
+
+def dump_product(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'special_status': product.special_status,
+        'description': product.description,
+        'category': {
+            'id': product.category.id,
+            'name': product.category.name,
         },
-        {
-            'title': 'New York',
-            'src': static('tasty.jpg'),
-            'text': 'Food is incomplete without a tasty dessert',
+        'image': product.image.url,
+        'image_variants': dump_image_variants(product),
+        'restaurant': {
+            'id': product.id,
+            'name': product.name,
         }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    }
 
 
-def product_list_api(request):
+def dump_products():
     products = Product.objects.select_related('category').available()
+    return [dump_product(product) for product in products]
 
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'description': product.description,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            },
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
+
+class ProductSearchForm(forms.Form):
+    q = forms.CharField(max_length=100)
+    limit = forms.IntegerField(min_value=1,
+                               max_value=settings.PRODUCT_SEARCH_MAX_LIMIT,
+                               required=False)
+
+
+def product_search_api(request):
+    form = ProductSearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse(form.errors, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+
+    products = search_products(
+        Product.objects.select_related('category').available(),
+        form.cleaned_data['q'],
+    )
+    limit = form.cleaned_data['limit'] or settings.PRODUCT_SEARCH_MAX_LIMIT
+    return JsonResponse([dump_product(product) for product in products[:limit]],
+                        safe=False, json_dumps_params={
+                            'ensure_ascii': False,
+                            'indent': 4,
+                        })
+
+
+def get_products_content(catalog_version):
+    cache_key = f'product_list_api:{catalog_version}'
+    content = cache.get(cache_key)
+    if content is None:
+        content = json.dumps(dump_products(), cls=DjangoJSONEncoder,
+                             ensure_ascii=False, indent=4).encode()
+        cache.set(cache_key, content, timeout=settings.CATALOG_CACHE_TIMEOUT)
+    return content
+
+
+@condition(etag_func=get_catalog_etag,
+           last_modified_func=get_catalog_last_modified)
+def product_list_api(request):
+    content = get_products_content(get_catalog_version(request))
+    response = HttpResponse(content, content_type='application/json')
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def load_order_products(product_ids):
+    return Product.objects.only('id', 'price').in_bulk(set(product_ids))
+
+
+def collect_product_ids(orders_data):
+    for order_data in orders_data:
+        if not isinstance(order_data, dict):
+            continue
+        products = order_data.get('products')
+        if not isinstance(products, list):
+            continue
+        for product in products:
+            if not isinstance(product, dict):
+                continue
+            try:
+                yield int(product.get('product'))
+            except (TypeError, ValueError):
+                continue
+
+
+def create_orders(orders_data):
+    orders = [
+        Order(
+            total_price=sum(
+                product['product'].price * product['quantity']
+                for product in order_data['products']
+            ),
+            **{
+                field: value for field, value in order_data.items()
+                if field != 'products'
             }
-        }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+        )
+        for order_data in orders_data
+    ]
+    if connection.features.can_return_rows_from_bulk_insert:
+        Order.objects.bulk_create(orders)
+    else:
+        for order in orders:
+            order.save()
+
+    OrderProduct.objects.bulk_create([
+        OrderProduct(order=order,
+                     product=product['product'],
+                     quantity=product['quantity'],
+                     price=product['product'].price)
+        for order, order_data in zip(orders, orders_data)
+        for product in order_data['products']
+    ])
+    return orders
 
 
 class OrderProductSerializer(ModelSerializer):
+    product = IntegerField()
 
     class Meta:
         model = OrderProduct
@@ -75,30 +181,108 @@ class OrderSerializer(ModelSerializer):
                                       write_only=True,
                                       allow_empty=False)
 
+    def validate_products(self, value):
+        products = self.context.get('products')
+        if products is None:
+            products = load_order_products(item['product'] for item in value)
+
+        errors = []
+        for item in value:
+            product = products.get(item['product'])
+            if product is None:
+                message = PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+                errors.append({'product': [message.format(pk_value=item['product'])]})
+                continue
+            item['product'] = product
+            errors.append({})
+        if any(errors):
+            raise ValidationError(errors)
+        return value
+
     def create(self, validated_data):
-        return Order.objects.create(**validated_data)
+        order, = create_orders([validated_data])
+        return order
 
     class Meta:
         model = Order
         fields = ['id', 'firstname', 'lastname', 'phonenumber', 'address', 'products']
 
 
-@transaction.atomic
+def place_order(order_data, idempotency_key=None):
+    if idempotency_key is not None:
+        request_hash = get_request_hash(order_data)
+        stored_response = get_stored_response(idempotency_key, request_hash)
+        if stored_response is not None:
+            return stored_response
+
+    serializer = OrderSerializer(data=order_data)
+    serializer.is_valid(raise_exception=True)
+    try:
+        with transaction.atomic():
+            if idempotency_key is not None:
+                stored_key = reserve_key(idempotency_key, request_hash)
+            order = serializer.save()
+            enqueue_addresses([order.address])
+            order_data_for_frontend = OrderSerializer(order).data
+            if idempotency_key is not None:
+                stored_key.order = order
+                stored_key.response = order_data_for_frontend
+                stored_key.save(update_fields=['order', 'response'])
+    except IntegrityError:
+        # Параллельный повтор с тем же ключом успел создать заказ первым
+        if idempotency_key is None:
+            raise
+        stored_response = get_stored_response(idempotency_key, request_hash)
+        if stored_response is None:
+            raise
+        return stored_response
+
+    return order_data_for_frontend
+
+
 @api_view(['POST'])
 def register_order(request):
-    serializer = OrderSerializer(data=request.data)
-    serializer.is_valid(raise_exception=True)
-    order = Order.objects.create(
-        firstname=serializer.validated_data['firstname'],
-        lastname=serializer.validated_data['lastname'],
-        phonenumber=serializer.validated_data['phonenumber'],
-        address=serializer.validated_data['address'])
-    for product in serializer.validated_data['products']:
-        OrderProduct.objects.create(product=product['product'],
-                                    quantity=product['quantity'],
-                                    price=product['product'].price,
-                                    order=order)
-
-    order_data_for_frontend = OrderSerializer(order)
-
-    return Response(order_data_for_frontend.data)
+    return Response(place_order(request.data, get_idempotency_key(request)))
+
+
+@api_view(['POST'])
+def register_orders(request):
+    orders_data = request.data
+    if not isinstance(orders_data, list):
+        raise ValidationError({'non_field_errors': ['Ожидается список заказов.']})
+    if len(orders_data) > settings.ORDER_BATCH_MAX_SIZE:
+        raise ValidationError({'non_field_errors': [
+            f'В одном запросе можно передать не больше '
+            f'{settings.ORDER_BATCH_MAX_SIZE} заказов.'
+        ]})
+
+    products = load_order_products(collect_product_ids(orders_data))
+    serializers = [
+        OrderSerializer(data=order_data, context={'products': products})
+        for order_data in orders_data
+    ]
+    valid_serializers = [
+        serializer for serializer in serializers if serializer.is_valid()
+    ]
+
+    with transaction.atomic():
+        orders = create_orders([
+            serializer.validated_data for serializer in valid_serializers
+        ])
+        enqueue_addresses(order.address for order in orders)
+
+    created_orders = dict(zip(valid_serializers, orders))
+    results = []
+    for serializer in serializers:
+        if serializer in created_orders:
+            results.append({
+                'status': 'created',
+                'order': OrderSerializer(created_orders[serializer]).data,
+            })
+        else:
+            results.append({
+                'status': 'error',
+                'errors': serializer.errors,
+            })
+
+    return Response(results)
@@ -1,7 +1,14 @@
 from django.contrib import admin
-from .models import Place
+from .models import Place, GeocodingTask
 
 # Register your models here.
 @admin.register(Place)
 class PlaceAdmin(admin.ModelAdmin):
-    pass
+    list_display = ['address', 'lat', 'lon', 'time']
+    search_fields = ['address']
+
+
+@admin.register(GeocodingTask)
+class GeocodingTaskAdmin(admin.ModelAdmin):
+    list_display = ['address', 'created_at', 'attempts']
+    search_fields = ['address']
@@ -0,0 +1,127 @@
+import numpy as np
+from django.conf import settings
+from geopy import distance
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+
+VINCENTY_MAX_ITERATIONS = 200
+VINCENTY_TOLERANCE = 1e-12
+
+
+def _as_points(coordinates):
+    return np.asarray(coordinates, dtype=float).reshape(-1, 2)
+
+
+def haversine_matrix(origins, destinations):
+    origins = np.radians(_as_points(origins))
+    destinations = np.radians(_as_points(destinations))
+
+    lat1 = origins[:, 0, np.newaxis]
+    lon1 = origins[:, 1, np.newaxis]
+    lat2 = destinations[np.newaxis, :, 0]
+    lon2 = destinations[np.newaxis, :, 1]
+
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2 +
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def ellipsoid_matrix(origins, destinations):
+    # Обратная задача Винсенти на эллипсоиде WGS-84 сразу для всех пар.
+    # Пары, для которых итерации не сошлись (почти антиподы),
+    # досчитываются поштучно через geopy.
+    origins = _as_points(origins)
+    destinations = _as_points(destinations)
+    lat1, lon1 = np.radians(origins).T[:, :, np.newaxis]
+    lat2, lon2 = np.radians(destinations).T[:, np.newaxis, :]
+
+    f = WGS84_F
+    u1 = np.arctan((1 - f) * np.tan(lat1))
+    u2 = np.arctan((1 - f) * np.tan(lat2))
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+
+    big_l = np.broadcast_to(lon2 - lon1, (len(origins), len(destinations)))
+    lambda_ = big_l.copy()
+    converged = np.zeros(big_l.shape, dtype=bool)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(VINCENTY_MAX_ITERATIONS):
+            sin_lambda, cos_lambda = np.sin(lambda_), np.cos(lambda_)
+            sin_sigma = np.hypot(
+                cos_u2 * sin_lambda,
+                cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lambda,
+            )
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lambda
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(
+                sin_sigma == 0, 0, cos_u1 * cos_u2 * sin_lambda / sin_sigma
+            )
+            cos_sq_alpha = 1 - sin_alpha ** 2
+            cos_2sigma_m = np.where(
+                cos_sq_alpha == 0,
+                0,
+                cos_sigma - 2 * sin_u1 * sin_u2 / cos_sq_alpha,
+            )
+            c = f / 16 * cos_sq_alpha * (4 + f * (4 - 3 * cos_sq_alpha))
+            previous_lambda = lambda_
+            lambda_ = big_l + (1 - c) * f * sin_alpha * (
+                sigma + c * sin_sigma * (
+                    cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+                )
+            )
+            converged = np.abs(lambda_ - previous_lambda) < VINCENTY_TOLERANCE
+            if converged.all():
+                break
+
+        u_sq = cos_sq_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+        big_a = 1 + u_sq / 16384 * (
+            4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq))
+        )
+        big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = big_b * sin_sigma * (
+            cos_2sigma_m + big_b / 4 * (
+                cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) -
+                big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) *
+                (-3 + 4 * cos_2sigma_m ** 2)
+            )
+        )
+        matrix = WGS84_B * big_a * (sigma - delta_sigma) / 1000
+
+    for row, column in zip(*np.nonzero(~converged | np.isnan(matrix))):
+        matrix[row, column] = distance.geodesic(
+            origins[row], destinations[column]
+        ).km
+    return matrix
+
+
+DISTANCE_METHODS = {
+    'haversine': haversine_matrix,
+    'ellipsoid': ellipsoid_matrix,
+}
+
+
+def distance_matrix(origins, destinations, method=None):
+    method = method or settings.DISTANCE_METHOD
+    return DISTANCE_METHODS[method](origins, destinations)
+
+
+def sort_rows(matrix, k=None):
+    matrix = np.asarray(matrix, dtype=float)
+    columns = matrix.shape[1]
+    if k is None or k >= columns:
+        return np.argsort(matrix, axis=1, kind='stable')
+    if k <= 0:
+        return np.empty((matrix.shape[0], 0), dtype=int)
+    nearest = np.argpartition(matrix, k - 1, axis=1)[:, :k]
+    order = np.argsort(
+        np.take_along_axis(matrix, nearest, axis=1), axis=1, kind='stable'
+    )
+    return np.take_along_axis(nearest, order, axis=1)
@@ -0,0 +1,71 @@
+import hashlib
+
+import httpx
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+YANDEX_GEOCODER_URL = "https://geocode-maps.yandex.ru/1.x"
+
+
+class PlaceNotFound(Exception):
+    pass
+
+
+def parse_coordinates(place, geocoder_response):
+    found_places = geocoder_response['response']['GeoObjectCollection']['featureMember']
+    if not found_places:
+        raise PlaceNotFound(place)
+    most_relevant = found_places[0]
+    lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
+    return float(lat), float(lon)
+
+
+def fetch_coordinates(apikey, place):
+    params = {"geocode":
+                  place, "apikey": apikey, "format": "json"}
+    response = requests.get(YANDEX_GEOCODER_URL, params=params)
+    response.raise_for_status()
+    return parse_coordinates(place, response.json())
+
+
+async def fetch_coordinates_async(client, apikey, place):
+    params = {"geocode":
+                  place, "apikey": apikey, "format": "json"}
+    response = await client.get(YANDEX_GEOCODER_URL, params=params)
+    response.raise_for_status()
+    return parse_coordinates(place, response.json())
+
+
+class YandexGeocoder:
+    def __init__(self, apikey=None):
+        self.apikey = apikey or settings.GEO_APIKEY
+
+    def __call__(self, place):
+        return fetch_coordinates(self.apikey, place)
+
+    async def geocode_async(self, place, client):
+        return await fetch_coordinates_async(client, self.apikey, place)
+
+
+class LocalGeocoder:
+    # Подменный геокодер для разработки и тестов: не ходит в сеть и для
+    # одного и того же адреса всегда возвращает одну и ту же точку в Москве
+
+    def __call__(self, place):
+        digest = hashlib.md5(place.encode()).digest()
+        lat = 55.55 + digest[0] / 255 * 0.4
+        lon = 37.35 + digest[1] / 255 * 0.5
+        return lat, lon
+
+    async def geocode_async(self, place, client):
+        return self(place)
+
+
+def get_geocoder():
+    return import_string(settings.GEOCODER)()
+
+
+def get_async_client():
+    return httpx.AsyncClient(timeout=settings.GEOCODER_TIMEOUT)
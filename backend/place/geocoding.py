@@ -0,0 +1,119 @@
+import asyncio
+import logging
+
+from django.conf import settings
+from django.utils import timezone
+
+from .geocoders import PlaceNotFound, get_async_client, get_geocoder
+from .models import Place, GeocodingTask
+
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_addresses(addresses):
+    tasks = [
+        GeocodingTask(address=address)
+        for address in set(addresses) if address
+    ]
+    GeocodingTask.objects.bulk_create(tasks, ignore_conflicts=True)
+
+
+def save_place(address, coordinates):
+    lat, lon = coordinates or (None, None)
+    place, _ = Place.objects.update_or_create(
+        address=address,
+        defaults={'lat': lat, 'lon': lon, 'time': timezone.now()},
+    )
+    return place
+
+
+async def geocode_addresses_async(addresses, geocoder):
+    semaphore = asyncio.Semaphore(settings.GEOCODER_CONCURRENCY)
+
+    async def geocode_address(address, client):
+        async with semaphore:
+            try:
+                return await geocoder.geocode_async(address, client)
+            except PlaceNotFound:
+                return None
+
+    async with get_async_client() as client:
+        results = await asyncio.gather(
+            *[geocode_address(address, client) for address in addresses],
+            return_exceptions=True,
+        )
+    return dict(zip(addresses, results))
+
+
+def geocode_addresses(addresses, geocoder):
+    if hasattr(geocoder, 'geocode_async'):
+        return asyncio.run(geocode_addresses_async(addresses, geocoder))
+
+    results = {}
+    for address in addresses:
+        try:
+            results[address] = geocoder(address)
+        except PlaceNotFound:
+            results[address] = None
+        except Exception as error:
+            results[address] = error
+    return results
+
+
+def get_retry_delay(attempts):
+    delay = settings.GEOCODER_RETRY_DELAY * 2 ** (attempts - 1)
+    return min(delay, settings.GEOCODER_MAX_RETRY_DELAY)
+
+
+def postpone_task(task, error):
+    attempts = task.attempts + 1
+    if attempts >= settings.GEOCODER_MAX_ATTEMPTS:
+        # Геокодер так и не ответил: адрес попадёт в отрицательный кеш,
+        # а когда тот устареет, менеджерская страница снова поставит
+        # адрес в очередь
+        logger.error('Не удалось определить координаты за %s попыток: %s',
+                     attempts, task.address, exc_info=error)
+        save_place(task.address, None)
+        task.delete()
+        return
+    logger.warning('Не удалось определить координаты, попытка %s: %s',
+                   attempts, task.address, exc_info=error)
+    GeocodingTask.objects.filter(pk=task.pk).update(
+        attempts=attempts,
+        next_attempt_at=timezone.now() + get_retry_delay(attempts),
+    )
+
+
+def process_geocoding_queue(batch_size=None, geocoder=None):
+    batch_size = batch_size or settings.GEOCODER_BATCH_SIZE
+    geocoder = geocoder or get_geocoder()
+
+    tasks = list(
+        GeocodingTask.objects
+            .filter(next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at')[:batch_size]
+    )
+    cached_places = (
+        Place.objects
+            .filter(address__in=[task.address for task in tasks])
+            .in_bulk(field_name='address')
+    )
+    expired_addresses = [
+        task.address for task in tasks
+        if task.address not in cached_places or
+        cached_places[task.address].is_expired()
+    ]
+    results = geocode_addresses(expired_addresses, geocoder) if expired_addresses else {}
+
+    processed = 0
+    for task in tasks:
+        if task.address in results:
+            result = results[task.address]
+            if isinstance(result, BaseException):
+                postpone_task(task, result)
+                continue
+            save_place(task.address, result)
+        task.delete()
+        processed += 1
+    return processed
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from place.models import Place
+
+
+class Command(BaseCommand):
+    help = 'Удаляет из кеша геокодера устаревшие и лишние адреса'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=None,
+                            help='Удалить адреса, запрошенные раньше, чем N дней назад')
+        parser.add_argument('--max-size', type=int, default=None,
+                            help='Оставить не больше N самых свежих адресов')
+
+    def handle(self, *args, **options):
+        deleted, _ = Place.objects.expired().filter(lat__isnull=True).delete()
+        self.stdout.write(f'Удалено ненайденных адресов: {deleted}')
+
+        if options['older_than_days'] is not None:
+            border = timezone.now() - timedelta(days=options['older_than_days'])
+            deleted, _ = Place.objects.filter(time__lt=border).delete()
+            self.stdout.write(f'Удалено старых адресов: {deleted}')
+
+        if options['max_size'] is not None:
+            oldest_kept = (
+                Place.objects
+                    .order_by('-time', '-id')
+                    .values_list('time', 'id')[options['max_size']:options['max_size'] + 1]
+            )
+            if oldest_kept:
+                border_time, border_id = oldest_kept[0]
+                deleted, _ = (
+                    Place.objects
+                        .filter(time__lte=border_time)
+                        .exclude(time=border_time, id__gt=border_id)
+                        .delete()
+                )
+                self.stdout.write(f'Удалено лишних адресов: {deleted}')
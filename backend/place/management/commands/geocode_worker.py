@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from place.geocoding import process_geocoding_queue
+
+
+class Command(BaseCommand):
+    help = 'Определяет координаты адресов из очереди геокодера'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Обработать очередь один раз и выйти')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--sleep', type=float, default=5,
+                            help='Пауза между проверками пустой очереди, сек')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_geocoding_queue(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Обработано адресов: {processed}')
+            if options['once']:
+                return
+            if not processed:
+                time.sleep(options['sleep'])
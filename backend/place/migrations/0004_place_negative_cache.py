@@ -0,0 +1,23 @@
+# Generated by Django 3.0.7 on 2026-10-18 19:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('place', '0003_geocodingtask'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='place',
+            name='lat',
+            field=models.FloatField(blank=True, max_length=20, null=True, verbose_name='Ширина'),
+        ),
+        migrations.AlterField(
+            model_name='place',
+            name='lon',
+            field=models.FloatField(blank=True, max_length=20, null=True, verbose_name='Долгота'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.14 on 2026-10-18 19:53
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('place', '0004_place_negative_cache'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='geocodingtask',
+            options={'ordering': ['next_attempt_at'], 'verbose_name': 'адрес в очереди геокодера', 'verbose_name_plural': 'адреса в очереди геокодера'},
+        ),
+        migrations.AddField(
+            model_name='geocodingtask',
+            name='next_attempt_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Дата следующей попытки'),
+        ),
+    ]
@@ -1,16 +1,32 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 
 
+class PlaceQuerySet(models.QuerySet):
+    def found(self):
+        return self.filter(lat__isnull=False, lon__isnull=False)
+
+    def expired(self):
+        now = timezone.now()
+        return self.filter(
+            Q(lat__isnull=False, time__lt=now - settings.GEOCODER_CACHE_TTL) |
+            Q(lat__isnull=True, time__lt=now - settings.GEOCODER_NEGATIVE_CACHE_TTL)
+        )
+
+
 class Place(models.Model):
     address = models.CharField('адрес', max_length=100,
                                unique=True, db_index=True)
-    lat = models.FloatField('Ширина', max_length=20)
-    lon = models.FloatField('Долгота', max_length=20)
+    lat = models.FloatField('Ширина', max_length=20, null=True, blank=True)
+    lon = models.FloatField('Долгота', max_length=20, null=True, blank=True)
     time = models.DateTimeField("Дата запроса к геокодеру",
                                 default=timezone.now,
                                 db_index=True)
 
+    objects = PlaceQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'место'
         verbose_name_plural = 'места'
@@ -18,4 +34,33 @@ class Place(models.Model):
     def __str__(self):
         return self.address
 
+    @property
+    def is_found(self):
+        return self.lat is not None and self.lon is not None
+
+    def is_expired(self):
+        if self.is_found:
+            ttl = settings.GEOCODER_CACHE_TTL
+        else:
+            ttl = settings.GEOCODER_NEGATIVE_CACHE_TTL
+        return self.time < timezone.now() - ttl
+
 
+class GeocodingTask(models.Model):
+    address = models.CharField('адрес', max_length=100, unique=True)
+    created_at = models.DateTimeField('Дата постановки в очередь',
+                                      default=timezone.now,
+                                      db_index=True)
+    attempts = models.PositiveSmallIntegerField('Количество попыток',
+                                                default=0)
+    next_attempt_at = models.DateTimeField('Дата следующей попытки',
+                                           default=timezone.now,
+                                           db_index=True)
+
+    class Meta:
+        verbose_name = 'адрес в очереди геокодера'
+        verbose_name_plural = 'адреса в очереди геокодера'
+        ordering = ['next_attempt_at']
+
+    def __str__(self):
+        return self.address
@@ -0,0 +1,144 @@
+import heapq
+import math
+from itertools import count
+
+import numpy as np
+
+from .distances import EARTH_RADIUS_KM
+
+
+LEAF_SIZE = 8
+
+
+def _to_xyz(lat, lon):
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    return np.stack([
+        np.cos(lat) * np.cos(lon),
+        np.cos(lat) * np.sin(lon),
+        np.sin(lat),
+    ], axis=-1)
+
+
+def _chord_to_km(chord_sq):
+    chord = math.sqrt(chord_sq)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+
+def _km_to_chord(km):
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+class _Node:
+    __slots__ = ('axis', 'split', 'left', 'right', 'indices')
+
+    def __init__(self, axis=None, split=None, left=None, right=None,
+                 indices=None):
+        self.axis = axis
+        self.split = split
+        self.left = left
+        self.right = right
+        self.indices = indices
+
+
+class SpatialIndex:
+    """KD-дерево по точкам на сфере.
+
+    Точки хранятся в декартовых координатах единичной сферы: длина хорды
+    монотонна по расстоянию вдоль поверхности, поэтому поиск ближайших
+    точно совпадает с поиском по формуле гаверсинусов.
+    """
+
+    def __init__(self, points):
+        points = list(points)
+        self.keys = [key for key, lat, lon in points]
+        self.coordinates = {key: (lat, lon) for key, lat, lon in points}
+        if points:
+            _, lats, lons = zip(*points)
+            self._xyz = _to_xyz(np.array(lats, dtype=float),
+                                np.array(lons, dtype=float))
+        else:
+            self._xyz = np.empty((0, 3))
+        self._root = self._build(np.arange(len(points)))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.coordinates
+
+    def _build(self, indices):
+        if len(indices) <= LEAF_SIZE:
+            return _Node(indices=indices)
+        points = self._xyz[indices]
+        axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+        order = np.argsort(points[:, axis], kind='stable')
+        middle = len(indices) // 2
+        return _Node(
+            axis=axis,
+            split=float(points[order[middle], axis]),
+            left=self._build(indices[order[:middle]]),
+            right=self._build(indices[order[middle:]]),
+        )
+
+    def iter_nearest(self, lat, lon):
+        """Перебирает (ключ, расстояние в км) в порядке удаления от точки."""
+        target = _to_xyz(lat, lon)
+        tie_breaker = count()
+        heap = [(0.0, next(tie_breaker), self._root, None)]
+        while heap:
+            bound, _, node, index = heapq.heappop(heap)
+            if node is None:
+                yield self.keys[index], _chord_to_km(bound)
+                continue
+            if node.indices is not None:
+                if not len(node.indices):
+                    continue
+                chords_sq = ((self._xyz[node.indices] - target) ** 2).sum(axis=1)
+                for index, chord_sq in zip(node.indices, chords_sq):
+                    heapq.heappush(
+                        heap, (float(chord_sq), next(tie_breaker), None, index)
+                    )
+                continue
+            offset = target[node.axis] - node.split
+            near, far = (node.left, node.right) if offset < 0 else (node.right, node.left)
+            heapq.heappush(heap, (bound, next(tie_breaker), near, None))
+            heapq.heappush(
+                heap, (max(bound, offset ** 2), next(tie_breaker), far, None)
+            )
+
+    def nearest(self, lat, lon, k=None, keys=None):
+        found = []
+        if k is not None and k <= 0:
+            return found
+        for key, distance_km in self.iter_nearest(lat, lon):
+            if keys is not None and key not in keys:
+                continue
+            found.append((key, distance_km))
+            if k is not None and len(found) >= k:
+                break
+        return found
+
+    def within(self, lat, lon, radius_km, keys=None):
+        target = _to_xyz(lat, lon)
+        radius_sq = _km_to_chord(radius_km) ** 2
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node.indices is not None:
+                if not len(node.indices):
+                    continue
+                chords_sq = ((self._xyz[node.indices] - target) ** 2).sum(axis=1)
+                for index, chord_sq in zip(node.indices, chords_sq):
+                    key = self.keys[index]
+                    if chord_sq <= radius_sq and (keys is None or key in keys):
+                        found.append((key, _chord_to_km(chord_sq)))
+                continue
+            offset = target[node.axis] - node.split
+            if offset < 0 or offset ** 2 <= radius_sq:
+                stack.append(node.left)
+            if offset >= 0 or offset ** 2 <= radius_sq:
+                stack.append(node.right)
+        found.sort(key=lambda item: item[1])
+        return found
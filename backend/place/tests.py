@@ -1,3 +1,294 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from geopy import distance
+
+from .distances import distance_matrix, haversine_matrix, sort_rows
+from .geocoders import LocalGeocoder, PlaceNotFound
+from .geocoding import enqueue_addresses, process_geocoding_queue
+from .models import GeocodingTask, Place
+from .spatial import SpatialIndex
+
+
+class FlakyGeocoder(LocalGeocoder):
+    def __init__(self, not_found=(), broken=()):
+        self.not_found = set(not_found)
+        self.broken = set(broken)
+
+    def __call__(self, place):
+        if place in self.not_found:
+            raise PlaceNotFound(place)
+        if place in self.broken:
+            raise ConnectionError(place)
+        return super().__call__(place)
+
+
+@override_settings(GEOCODER_MAX_ATTEMPTS=3,
+                   GEOCODER_RETRY_DELAY=timedelta(seconds=30),
+                   GEOCODER_MAX_RETRY_DELAY=timedelta(minutes=5))
+class GeocodingQueueTest(TestCase):
+    address = 'Москва, Красная площадь, 1'
+
+    def make_tasks_due(self):
+        GeocodingTask.objects.update(next_attempt_at=timezone.now())
+
+    def test_found_address_is_saved(self):
+        enqueue_addresses([self.address, self.address, ''])
+
+        processed = process_geocoding_queue(geocoder=LocalGeocoder())
+
+        self.assertEqual(processed, 1)
+        self.assertFalse(GeocodingTask.objects.exists())
+        place = Place.objects.get(address=self.address)
+        self.assertTrue(place.is_found)
+        self.assertEqual((place.lat, place.lon), LocalGeocoder()(self.address))
+
+    def test_not_found_address_is_cached_negatively(self):
+        enqueue_addresses([self.address])
+
+        process_geocoding_queue(geocoder=FlakyGeocoder(not_found=[self.address]))
+
+        self.assertFalse(GeocodingTask.objects.exists())
+        place = Place.objects.get(address=self.address)
+        self.assertFalse(place.is_found)
+        self.assertFalse(place.is_expired())
+
+    def test_error_is_retried_with_backoff(self):
+        enqueue_addresses([self.address])
+        broken_geocoder = FlakyGeocoder(broken=[self.address])
+
+        with self.assertLogs('place.geocoding', 'WARNING'):
+            processed = process_geocoding_queue(geocoder=broken_geocoder)
+
+        self.assertEqual(processed, 0)
+        task = GeocodingTask.objects.get()
+        self.assertEqual(task.attempts, 1)
+        self.assertGreater(task.next_attempt_at,
+                           timezone.now() + timedelta(seconds=25))
+        # До следующей попытки задача не берётся
+        self.assertEqual(process_geocoding_queue(geocoder=LocalGeocoder()), 0)
+
+        self.make_tasks_due()
+        self.assertEqual(process_geocoding_queue(geocoder=LocalGeocoder()), 1)
+        self.assertTrue(Place.objects.get(address=self.address).is_found)
+
+    def test_exhausted_task_becomes_negative_place(self):
+        enqueue_addresses([self.address])
+        broken_geocoder = FlakyGeocoder(broken=[self.address])
+
+        with self.assertLogs('place.geocoding', 'WARNING'):
+            for _ in range(3):
+                self.make_tasks_due()
+                process_geocoding_queue(geocoder=broken_geocoder)
+
+        self.assertFalse(GeocodingTask.objects.exists())
+        self.assertFalse(Place.objects.get(address=self.address).is_found)
+
+    def test_expired_negative_place_is_geocoded_again(self):
+        Place.objects.create(address=self.address,
+                             time=timezone.now() - timedelta(days=2))
+
+        enqueue_addresses([self.address])
+        self.assertEqual(process_geocoding_queue(geocoder=LocalGeocoder()), 1)
+        self.assertTrue(Place.objects.get(address=self.address).is_found)
+
+
+def create_place(address, age, found=True):
+    coordinates = {'lat': 55.75, 'lon': 37.61} if found else {}
+    return Place.objects.create(address=address,
+                                time=timezone.now() - age, **coordinates)
+
+
+@override_settings(GEOCODER_CACHE_TTL=timedelta(days=90),
+                   GEOCODER_NEGATIVE_CACHE_TTL=timedelta(hours=24))
+class PlaceExpiryTest(TestCase):
+    def test_found_place_expires_after_ttl(self):
+        fresh = create_place('свежий', timedelta(days=89))
+        stale = create_place('старый', timedelta(days=91))
+
+        self.assertFalse(fresh.is_expired())
+        self.assertTrue(stale.is_expired())
+        self.assertEqual(list(Place.objects.expired()), [stale])
+
+    def test_negative_place_expires_after_negative_ttl(self):
+        fresh = create_place('свежий', timedelta(hours=23), found=False)
+        stale = create_place('старый', timedelta(hours=25), found=False)
+        # Найденный адрес того же возраста ещё действителен
+        found = create_place('найденный', timedelta(hours=25))
+
+        self.assertFalse(fresh.is_expired())
+        self.assertTrue(stale.is_expired())
+        self.assertFalse(found.is_expired())
+        self.assertEqual(list(Place.objects.expired()), [stale])
+
+
+@override_settings(GEOCODER_CACHE_TTL=timedelta(days=90),
+                   GEOCODER_NEGATIVE_CACHE_TTL=timedelta(hours=24))
+class EvictPlacesTest(TestCase):
+    def evict(self, **options):
+        output = StringIO()
+        call_command('evict_places', stdout=output, **options)
+        return output.getvalue()
+
+    def get_addresses(self):
+        return set(Place.objects.values_list('address', flat=True))
+
+    def test_expired_negative_places_are_deleted(self):
+        create_place('ненайденный старый', timedelta(days=2), found=False)
+        create_place('ненайденный свежий', timedelta(hours=1), found=False)
+        # Устаревшие найденные адреса без параметров не удаляются,
+        # их координаты нужны, пока геокодер не ответит снова
+        create_place('найденный старый', timedelta(days=100))
+
+        output = self.evict()
+
+        self.assertIn('Удалено ненайденных адресов: 1', output)
+        self.assertEqual(self.get_addresses(),
+                         {'ненайденный свежий', 'найденный старый'})
+
+    def test_older_than_days(self):
+        create_place('давний', timedelta(days=31))
+        create_place('недавний', timedelta(days=29))
+
+        output = self.evict(older_than_days=30)
+
+        self.assertIn('Удалено старых адресов: 1', output)
+        self.assertEqual(self.get_addresses(), {'недавний'})
+
+    def test_max_size_keeps_newest_places(self):
+        for days in range(5):
+            create_place(f'адрес {days}', timedelta(days=days))
+
+        output = self.evict(max_size=2)
+
+        self.assertIn('Удалено лишних адресов: 3', output)
+        self.assertEqual(self.get_addresses(), {'адрес 0', 'адрес 1'})
+
+    def test_max_size_with_same_time(self):
+        now = timezone.now()
+        places = [Place.objects.create(address=f'адрес {number}', time=now)
+                  for number in range(4)]
+
+        self.evict(max_size=3)
+
+        self.assertEqual(self.get_addresses(),
+                         {place.address for place in places[1:]})
+
+    def test_max_size_above_cache_size(self):
+        create_place('адрес', timedelta(days=1))
+
+        output = self.evict(max_size=10)
+
+        self.assertNotIn('Удалено лишних адресов', output)
+        self.assertEqual(self.get_addresses(), {'адрес'})
+
+
+MOSCOW = (55.7558, 37.6173)
+POINTS = [
+    (55.7558, 37.6173),
+    (59.9343, 30.3351),
+    (40.7128, -74.0060),
+    (-33.8688, 151.2093),
+    (0.0, 0.0),
+    (0.5, 179.7),
+]
+
+
+class DistanceMatrixTest(SimpleTestCase):
+    def test_haversine_matches_geopy_great_circle(self):
+        matrix = distance_matrix(POINTS, POINTS, method='haversine')
+
+        for row, origin in enumerate(POINTS):
+            for column, destination in enumerate(POINTS):
+                self.assertAlmostEqual(
+                    matrix[row, column],
+                    distance.great_circle(origin, destination).km,
+                    delta=1e-3,
+                )
+
+    def test_ellipsoid_matches_geopy_geodesic(self):
+        # Последняя пара — почти антиподы, где Винсенти не сходится
+        matrix = distance_matrix(POINTS, POINTS, method='ellipsoid')
+
+        for row, origin in enumerate(POINTS):
+            for column, destination in enumerate(POINTS):
+                self.assertAlmostEqual(
+                    matrix[row, column],
+                    distance.geodesic(origin, destination).km,
+                    delta=1e-3,
+                )
+
+    def test_shape(self):
+        matrix = distance_matrix([MOSCOW], POINTS, method='haversine')
+
+        self.assertEqual(matrix.shape, (1, len(POINTS)))
+        self.assertEqual(matrix[0, 0], 0)
+
+    def test_sort_rows(self):
+        matrix = np.array([[3.0, 1.0, 2.0, 1.0]])
+
+        self.assertEqual(sort_rows(matrix).tolist(), [[1, 3, 2, 0]])
+        self.assertEqual(sort_rows(matrix, k=2).tolist(), [[1, 3]])
+        self.assertEqual(sort_rows(matrix, k=0).tolist(), [[]])
+        self.assertEqual(sort_rows(matrix, k=10).tolist(), [[1, 3, 2, 0]])
+
+
+class SpatialIndexTest(SimpleTestCase):
+    def setUp(self):
+        randomizer = np.random.default_rng(7)
+        lats = randomizer.uniform(55.5, 56.0, 200)
+        lons = randomizer.uniform(37.3, 37.9, 200)
+        self.points = [
+            (f'restaurant-{number}', lat, lon)
+            for number, (lat, lon) in enumerate(zip(lats, lons))
+        ]
+        self.index = SpatialIndex(self.points)
+
+    def brute_force(self, lat, lon):
+        distances = haversine_matrix([(lat, lon)],
+                                     [(lat, lon) for _, lat, lon in self.points])[0]
+        return sorted(
+            zip([key for key, _, _ in self.points], distances),
+            key=lambda item: item[1],
+        )
+
+    def test_nearest_matches_brute_force(self):
+        expected = self.brute_force(*MOSCOW)
+
+        found = self.index.nearest(*MOSCOW, k=10)
+
+        self.assertEqual([key for key, _ in found],
+                         [key for key, _ in expected[:10]])
+        for (_, found_km), (_, expected_km) in zip(found, expected):
+            self.assertAlmostEqual(found_km, expected_km, delta=1e-6)
+
+    def test_nearest_filters_keys(self):
+        keys = {'restaurant-1', 'restaurant-2', 'restaurant-3'}
+        expected = [
+            key for key, _ in self.brute_force(*MOSCOW) if key in keys
+        ]
+
+        found = self.index.nearest(*MOSCOW, keys=keys)
+
+        self.assertEqual([key for key, _ in found], expected)
+
+    def test_within_matches_brute_force(self):
+        expected = [
+            key for key, km in self.brute_force(*MOSCOW) if km <= 5
+        ]
+
+        found = self.index.within(*MOSCOW, radius_km=5)
+
+        self.assertTrue(expected)
+        self.assertEqual([key for key, _ in found], expected)
+
+    def test_empty_index(self):
+        index = SpatialIndex([])
+
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.nearest(*MOSCOW, k=3), [])
+        self.assertEqual(index.within(*MOSCOW, radius_km=10), [])
@@ -1,3 +1,248 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import parse_qs
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from foodcartapp.models import Order, Product, Restaurant, RestaurantMenuItem
+from place.models import Place
+from . import views
+
+
+class UpdateMenuAvailabilityTest(TestCase):
+    def setUp(self):
+        self.manager = get_user_model().objects.create_user('manager',
+                                                            is_staff=True)
+        self.client.force_login(self.manager)
+        self.product = Product.objects.create(name='Бургер', price=Decimal(100))
+        self.restaurant = Restaurant.objects.create(name='Star Burger',
+                                                    address='Москва, Тверская, 1')
+        self.url = reverse('restaurateur:update_menu_availability')
+
+    def test_selected_cells_are_enabled(self):
+        response = self.client.post(self.url, {
+            'cells': [f'{self.restaurant.id}-{self.product.id}', '999-999'],
+            'availability': 'true',
+        })
+
+        self.assertRedirects(response, reverse('restaurateur:ProductsView'),
+                             fetch_redirect_response=False)
+        self.assertTrue(RestaurantMenuItem.objects.get().availability)
+        self.assertEqual(list(get_messages(response.wsgi_request)), [])
+
+    def test_invalid_form_errors_are_shown(self):
+        response = self.client.post(self.url, {
+            'cells': ['broken'],
+            'availability': 'true',
+        })
+
+        self.assertRedirects(response, reverse('restaurateur:ProductsView'),
+                             fetch_redirect_response=False)
+        self.assertFalse(RestaurantMenuItem.objects.exists())
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            ['Ячейки меню: Неверная ячейка меню: broken'],
+        )
+
+    def test_empty_selection_is_reported(self):
+        response = self.client.post(self.url, {'availability': 'true'})
+
+        messages = list(get_messages(response.wsgi_request))
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0].level_tag, 'error')
+
+    def test_only_managers_can_change_menu(self):
+        self.client.logout()
+
+        response = self.client.post(self.url, {
+            'cells': [f'{self.restaurant.id}-{self.product.id}'],
+            'availability': 'true',
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(RestaurantMenuItem.objects.exists())
+
+
+@override_settings(
+    ORDERS_PAGE_SIZE=2,
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+)
+class OrdersPaginationTest(TestCase):
+    def setUp(self):
+        self.manager = get_user_model().objects.create_user('manager',
+                                                            is_staff=True)
+        self.client.force_login(self.manager)
+        self.url = reverse('restaurateur:view_orders')
+        self.registrated_at = timezone.now() - timedelta(hours=1)
+
+    def create_order(self, registrated_at=None, **kwargs):
+        return Order.objects.create(
+            firstname='Иван',
+            lastname='Иванов',
+            phonenumber='+79001234567',
+            address='Москва, улица, 1',
+            registrated_at=registrated_at or self.registrated_at,
+            **kwargs,
+        )
+
+    def get_page(self, data):
+        response = self.client.get(self.url, data)
+        self.assertEqual(response.status_code, 200)
+        order_ids = [item['id'] for item in response.context['order_items']]
+        return response, order_ids
+
+    def get_all_pages(self, data):
+        order_ids = []
+        while True:
+            response, page_ids = self.get_page(data)
+            order_ids.extend(page_ids)
+            next_page_query = response.context['next_page_query']
+            if not next_page_query:
+                return order_ids
+            data = parse_qs(next_page_query)
+
+    def test_orders_with_same_time_are_not_skipped(self):
+        orders = [self.create_order() for _ in range(5)]
+
+        self.assertEqual(self.get_all_pages({}),
+                         [order.id for order in orders])
+
+    def test_orders_are_sorted_by_registration_time(self):
+        late = self.create_order()
+        early = self.create_order(self.registrated_at - timedelta(minutes=1))
+        tied = self.create_order()
+
+        self.assertEqual(self.get_all_pages({}), [early.id, late.id, tied.id])
+
+    def test_filters_are_kept_on_next_pages(self):
+        cash_orders = [self.create_order(payment_method='Наличностью')
+                       for _ in range(3)]
+        self.create_order(payment_method='Электронно')
+        self.create_order(payment_method='Наличностью',
+                          order_status='Обработанный')
+
+        response, _ = self.get_page({'payment_method': 'Наличностью'})
+        next_page_data = parse_qs(response.context['next_page_query'])
+
+        self.assertEqual(next_page_data['payment_method'], ['Наличностью'])
+        self.assertEqual(next_page_data['status'], ['Необработанный'])
+        self.assertEqual(self.get_all_pages({'payment_method': 'Наличностью'}),
+                         [order.id for order in cash_orders])
+
+    def test_broken_cursor_shows_form_error(self):
+        self.create_order()
+        cursors = [
+            'broken',
+            f'{self.registrated_at.isoformat()}_',
+            f'{self.registrated_at.isoformat()}_abc',
+            '2021-13-45T25:00:00_1',
+            f'{self.registrated_at.isoformat()}_{"9" * 30}',
+        ]
+
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response, order_ids = self.get_page({'after': cursor})
+
+                self.assertEqual(order_ids, [])
+                self.assertEqual(
+                    response.context['filter_form'].errors['after'],
+                    ['Неверная ссылка на страницу'],
+                )
+
+    def test_cursor_without_timezone_is_accepted(self):
+        first = self.create_order()
+        second = self.create_order()
+        naive_time = timezone.make_naive(first.registrated_at)
+
+        _, order_ids = self.get_page(
+            {'after': f'{naive_time.isoformat()}_{first.id}'},
+        )
+
+        self.assertEqual(order_ids, [second.id])
+
+
+@override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+)
+class FragmentCacheTest(TransactionTestCase):
+    available_icon = 'id="Capa_1"'
+    unavailable_icon = 'id="Layer_1"'
+
+    def setUp(self):
+        cache.clear()
+        self.manager = get_user_model().objects.create_user('manager',
+                                                            is_staff=True)
+        self.client.force_login(self.manager)
+        self.product = Product.objects.create(
+            name='Бургер', price=Decimal(100),
+            # С готовыми image_variants сохранение товара не трогает файлы
+            image='burger.jpg',
+            image_variants={'source': 'burger.jpg', 'sizes': {}},
+        )
+        self.restaurants = [
+            Restaurant.objects.create(name=f'Star Burger {number}',
+                                      address=f'Москва, улица, {number}')
+            for number in range(1, 3)
+        ]
+        self.menu_items = [
+            RestaurantMenuItem.objects.create(restaurant=restaurant,
+                                              product=self.product)
+            for restaurant in self.restaurants
+        ]
+
+    def get_products_page(self):
+        response = self.client.get(reverse('restaurateur:ProductsView'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_menu_item_change_is_rendered(self):
+        content = self.get_products_page()
+        self.assertEqual(content.count(self.available_icon), 2)
+
+        menu_item = self.menu_items[0]
+        menu_item.availability = False
+        menu_item.save()
+
+        content = self.get_products_page()
+        self.assertEqual(content.count(self.available_icon), 1)
+        self.assertEqual(content.count(self.unavailable_icon), 1)
+
+    def test_product_change_is_rendered(self):
+        self.get_products_page()
+
+        self.product.name = 'Чизбургер'
+        self.product.save()
+
+        self.assertIn('<td>Чизбургер</td>', self.get_products_page())
+
+    def test_cached_order_row_skips_distances(self):
+        for number, restaurant in enumerate(self.restaurants):
+            Place.objects.create(address=restaurant.address,
+                                 lat=55.75, lon=37.60 + number * 0.1)
+        Place.objects.create(address='Москва, Тверская, 1',
+                             lat=55.75, lon=37.61)
+        order = Order.objects.create(firstname='Иван', lastname='Петров',
+                                     phonenumber='+79161234567',
+                                     address='Москва, Тверская, 1')
+        order.products.create(product=self.product, quantity=1,
+                              price=self.product.price)
+        url = reverse('restaurateur:view_orders')
+
+        with mock.patch.object(views, 'get_restaurant_distance',
+                               wraps=views.get_restaurant_distance) as distance:
+            first_response = self.client.get(url)
+            second_response = self.client.get(url)
+            self.assertEqual(distance.call_count, 1)
+
+            Place.objects.filter(address=order.address).update(lon=37.70)
+            self.client.get(url)
+            self.assertEqual(distance.call_count, 2)
+
+        self.assertContains(first_response, 'Star Burger 1 - ')
+        self.assertContains(second_response, 'Star Burger 1 - ')
@@ -1,11 +1,19 @@
+import hashlib
+from datetime import datetime, time, timedelta
+from functools import partial
+
 from django import forms
+from django.contrib import messages
 from django.db.models import Q
 from django.db.models.query import Prefetch
 from django.shortcuts import redirect, render
+from django.views.decorators.http import require_POST
 from django.views import View
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.decorators import user_passes_test
 from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
@@ -13,11 +21,13 @@ from django.contrib.auth import views as auth_views
 from foodcartapp.models import Order, OrderProduct
 from foodcartapp.models import RestaurantMenuItem
 from foodcartapp.models import Product, Restaurant
+from foodcartapp.availability import get_availability, set_availability
+from foodcartapp.claims import claim_orders, release_orders
+from foodcartapp.locations import get_restaurant_index
+from foodcartapp.versions import RESTAURANT_LOCATIONS, get_version
 from place.models import Place
-
-import requests
-from geopy import distance
-from functools import reduce
+from place.geocoding import enqueue_addresses
+from place.distances import distance_matrix, sort_rows
 
 
 class Login(forms.Form):
@@ -75,28 +85,85 @@ def is_manager(user):
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_products(request):
     restaurants = list(Restaurant.objects.order_by('name'))
-    products = list(Product.objects.prefetch_related('menu_items'))
+    products = Product.objects.select_related('category')
+    availability = get_availability()
 
-    default_availability = {restaurant.id: False for restaurant in restaurants}
     products_with_restaurants = []
     for product in products:
-
-        availability = {
-            **default_availability,
-            **{item.restaurant_id: item.availability for item in product.menu_items.all()},
-        }
-        orderer_availability = [availability[restaurant.id] for restaurant in restaurants]
-
+        orderer_availability = [
+            (restaurant, availability.is_available(restaurant.id, product.id))
+            for restaurant in restaurants
+        ]
+        row_version = get_fragment_version(
+            product.name, product.category, product.price, product.image.name,
+            [(restaurant.id, restaurant.name, available)
+             for restaurant, available in orderer_availability],
+        )
         products_with_restaurants.append(
-            (product, orderer_availability)
+            (product, orderer_availability, row_version)
         )
 
     return render(request, template_name="products_list.html", context={
         'products_with_restaurants': products_with_restaurants,
         'restaurants': restaurants,
+        'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
     })
 
 
+class MenuCellsField(forms.Field):
+    widget = forms.MultipleHiddenInput
+    default_error_messages = {
+        'invalid': 'Неверная ячейка меню: %(value)s',
+    }
+
+    def to_python(self, value):
+        cells = []
+        for cell in value or []:
+            restaurant_id, _, product_id = str(cell).partition('-')
+            if not restaurant_id.isdigit() or not product_id.isdigit():
+                raise forms.ValidationError(self.error_messages['invalid'],
+                                            code='invalid',
+                                            params={'value': cell})
+            cells.append((int(restaurant_id), int(product_id)))
+        return cells
+
+
+class MenuAvailabilityForm(forms.Form):
+    cells = MenuCellsField(label='Ячейки меню')
+    availability = forms.BooleanField(label='В продаже', required=False)
+
+    def clean_cells(self):
+        cells = self.cleaned_data['cells']
+        restaurant_ids = set(
+            Restaurant.objects
+                .filter(id__in={restaurant_id for restaurant_id, _ in cells})
+                .values_list('id', flat=True)
+        )
+        product_ids = set(
+            Product.objects
+                .filter(id__in={product_id for _, product_id in cells})
+                .values_list('id', flat=True)
+        )
+        return [
+            (restaurant_id, product_id) for restaurant_id, product_id in cells
+            if restaurant_id in restaurant_ids and product_id in product_ids
+        ]
+
+
+@require_POST
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def update_menu_availability(request):
+    form = MenuAvailabilityForm(request.POST)
+    if form.is_valid():
+        set_availability(form.cleaned_data['cells'],
+                         form.cleaned_data['availability'])
+    else:
+        for field in form:
+            for error in field.errors:
+                messages.error(request, f'{field.label}: {error}')
+    return redirect('restaurateur:ProductsView')
+
+
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_restaurants(request):
     return render(request, template_name="restaurants_list.html", context={
@@ -104,85 +171,195 @@ def view_restaurants(request):
     })
 
 
-def fetch_coordinates(apikey, place):
-
-    base_url = "https://geocode-maps.yandex.ru/1.x"
-    params = {"geocode":
-                  place, "apikey": apikey, "format": "json"}
-    response = requests.get(base_url, params=params)
-    response.raise_for_status()
-    found_places = response.json()['response']['GeoObjectCollection']['featureMember']
-    most_relevant = found_places[0]
-    lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
-    return Place.objects.create(address=place, lon=lon, lat=lat)
+def get_fragment_version(*parts):
+    # Версия строки для {% cache %}: меняется вместе с данными строки
+    return hashlib.md5(repr(parts).encode()).hexdigest()
 
 
 def get_place_coordinates(new_place, exists_places_data):
     if new_place not in exists_places_data:
-        order_coordinates = fetch_coordinates(settings.GEO_APIKEY, new_place)
-        return order_coordinates.lat, order_coordinates.lon
+        return None
+    if not exists_places_data[new_place].is_found:
+        return None
     order_coordinates_lat = exists_places_data[new_place].lat
     order_coordinates_lon = exists_places_data[new_place].lon
     return order_coordinates_lat, order_coordinates_lon
 
 
-@user_passes_test(is_manager, login_url='restaurateur:login')
-def view_orders(request):
-
-    nonprocessed_orders = (
-        Order.objects
-            .filter(order_status='Необработанный')
-            .prefetch_related('products')
-            .order_price()
+class OrderFilterForm(forms.Form):
+    status = forms.ChoiceField(
+        label='Статус', required=False,
+        choices=[('', 'Все')] + Order.ORDER_STATUS_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control'})
     )
-
-    places = (
-        Place.objects
-            .filter(
-                Q(address__in=nonprocessed_orders.values_list('address')) |
-                Q(address__in=Restaurant.objects.values_list('address'))
+    payment_method = forms.ChoiceField(
+        label='Способ оплаты', required=False,
+        choices=[('', 'Все')] + Order.PAYMENT_METHOD_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    restaurant = forms.ModelChoiceField(
+        label='Ресторан', required=False,
+        queryset=Restaurant.objects.order_by('name'),
+        empty_label='Все',
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    date_from = forms.DateField(
+        label='С', required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    date_to = forms.DateField(
+        label='По', required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    mine = forms.BooleanField(label='Только мои', required=False)
+    after = forms.CharField(required=False, widget=forms.HiddenInput)
+
+    def clean_after(self):
+        after = self.cleaned_data['after']
+        if not after:
+            return None
+        registrated_at, _, order_id = after.rpartition('_')
+        try:
+            registrated_at = parse_datetime(registrated_at)
+        except ValueError:
+            registrated_at = None
+        if (registrated_at is None or not order_id.isdigit()
+                or len(order_id) > 18):
+            raise forms.ValidationError('Неверная ссылка на страницу')
+        if timezone.is_naive(registrated_at):
+            registrated_at = timezone.make_aware(registrated_at)
+        return registrated_at, int(order_id)
+
+    def filter(self, orders):
+        if self.cleaned_data['status']:
+            orders = orders.filter(order_status=self.cleaned_data['status'])
+        if self.cleaned_data['payment_method']:
+            orders = orders.filter(payment_method=self.cleaned_data['payment_method'])
+        if self.cleaned_data['restaurant']:
+            orders = orders.filter(restaurant=self.cleaned_data['restaurant'])
+        if self.cleaned_data['date_from']:
+            orders = orders.filter(
+                registrated_at__gte=get_day_start(self.cleaned_data['date_from'])
             )
-            .in_bulk(field_name='address')
+        if self.cleaned_data['date_to']:
+            orders = orders.filter(
+                registrated_at__lt=get_day_start(
+                    self.cleaned_data['date_to'] + timedelta(days=1))
+            )
+        if self.cleaned_data['after']:
+            registrated_at, order_id = self.cleaned_data['after']
+            orders = orders.filter(
+                Q(registrated_at__gt=registrated_at) |
+                Q(registrated_at=registrated_at, id__gt=order_id)
+            )
+        return orders.order_by('registrated_at', 'id')
+
+
+class ClaimOrdersForm(forms.Form):
+    count = forms.IntegerField(
+        label='Взять в работу', min_value=1,
+        max_value=settings.ORDERS_PAGE_SIZE, initial=10,
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
     )
 
-    products = Product.objects.all()
-    restaurants = Restaurant.objects.all()
-    products_with_restaurants = {
-        product.id: restaurants.filter(menu_items__product__id=product.id) for
-                                 product in products
-    }
 
-    order_items = []
-    for order in nonprocessed_orders:
-        order_coordinates_lat, order_coordinates_lon = get_place_coordinates(order.address, places)
+def get_restaurant_distance(order_coordinates, restaurant_ids, restaurants,
+                            restaurant_index):
+    nearest_restaurant_ids = []
+    if order_coordinates is not None:
+        nearest_restaurant_ids = [
+            restaurant_id for restaurant_id, _ in restaurant_index.nearest(
+                *order_coordinates,
+                k=settings.NEAREST_RESTAURANTS_LIMIT or None,
+                keys=set(restaurant_ids),
+            )
+        ]
+
+    sorted_restaurant_with_distance = {}
+    if nearest_restaurant_ids:
+        distances = distance_matrix(
+            [order_coordinates],
+            [restaurant_index.coordinates[restaurant_id]
+             for restaurant_id in nearest_restaurant_ids],
+        )
+        for column in sort_rows(distances)[0]:
+            restaurant = restaurants[nearest_restaurant_ids[column]]
+            sorted_restaurant_with_distance[restaurant] = round(
+                float(distances[0, column]), 3)
 
-        order_products_ids = [order_product.product_id for order_product in order.products.all()]
-        restaurants = [products_with_restaurants[product_id] for product_id in order_products_ids]
+    for restaurant_id in restaurant_ids:
+        if order_coordinates is None or restaurant_id not in restaurant_index:
+            sorted_restaurant_with_distance[restaurants[restaurant_id]] = None
+    return sorted_restaurant_with_distance
 
-        result_restaurants = (reduce(lambda a, b: set(a) & set(b),
-                                     restaurants))
 
-        distance_to_restaurant = []
+def get_day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
 
-        for restaurant in result_restaurants:
-            restaurant_coordinates_lat, restaurant_coordinates_lon = get_place_coordinates(
-                restaurant.address, places)
 
-            delivery_distance = distance.distance(
-                (order_coordinates_lat, order_coordinates_lon),
-                (restaurant_coordinates_lat, restaurant_coordinates_lon))
+def get_order_cursor(order):
+    return f'{order.registrated_at.isoformat()}_{order.id}'
 
-            distance_to_restaurant.append(round(delivery_distance.km, 3))
 
-        restaurant_with_distance = dict(zip(result_restaurants,
-                                            distance_to_restaurant))
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_orders(request):
+    filter_data = request.GET.copy()
+    filter_data.setdefault('status', 'Необработанный')
+    filter_form = OrderFilterForm(filter_data)
+
+    orders = []
+    next_page_query = None
+    if filter_form.is_valid():
+        page_size = settings.ORDERS_PAGE_SIZE
+        orders = Order.objects.all()
+        if filter_form.cleaned_data['mine']:
+            orders = orders.claimed_by_manager(request.user)
+        orders = list(
+            filter_form.filter(orders)
+                .select_related('claimed_by')
+                .prefetch_related('products')[:page_size + 1]
+        )
+        if len(orders) > page_size:
+            orders = orders[:page_size]
+            next_page_data = filter_data.copy()
+            next_page_data['after'] = get_order_cursor(orders[-1])
+            next_page_query = next_page_data.urlencode()
+
+    restaurants = Restaurant.objects.in_bulk()
+    restaurant_index = get_restaurant_index()
+    locations_version = get_version(RESTAURANT_LOCATIONS)
+    availability = get_availability()
+
+    addresses = {order.address for order in orders}
+    addresses.update(restaurant.address for restaurant in restaurants.values())
+    places = (
+        Place.objects
+            .filter(address__in=addresses)
+            .in_bulk(field_name='address')
+    )
 
-        sorted_restaurant_with_distance_keys = sorted(restaurant_with_distance,
-                                                      key=restaurant_with_distance.get)
+    pending_addresses = {
+        address for address in addresses
+        if address not in places or places[address].is_expired()
+    }
 
-        sorted_restaurant_with_distance = {
-            key: restaurant_with_distance[key] for key in sorted_restaurant_with_distance_keys
-        }
+    order_items = []
+    for order in orders:
+        restaurant_ids = availability.get_restaurant_ids(
+            order_product.product_id for order_product in order.products.all()
+        )
+        order_coordinates = get_place_coordinates(order.address, places)
+
+        restaurant_distance_version = get_fragment_version(
+            order.address, order_coordinates, order.address in places,
+            restaurant_ids, locations_version,
+        )
+        # Расстояния считаются, только если строки нет в кеше шаблона:
+        # шаблон сам вызовет функцию, когда обратится к значению
+        restaurant_distance = partial(
+            get_restaurant_distance, order_coordinates, restaurant_ids,
+            restaurants, restaurant_index,
+        )
 
         order_items.append({
             'id': order.id,
@@ -193,11 +370,43 @@ def view_orders(request):
             'address': order.address,
             'comment': order.comment,
             'payment_method': order.payment_method,
-            'restaurant_distance': sorted_restaurant_with_distance
+            'restaurant': restaurants.get(order.restaurant_id),
+            'auto_assigned': order.auto_assigned,
+            'manager': order.claimed_by if order.get_active_claim() else None,
+            'restaurant_distance': restaurant_distance,
+            'restaurant_distance_version': restaurant_distance_version,
+            'coordinates_pending': order.address not in places,
+            'address_not_found': (
+                order.address in places and not places[order.address].is_found
+            ),
         })
 
+    enqueue_addresses(pending_addresses)
+
     return render(request,
                   template_name='order_items.html',
-                  context={'order_items': order_items})
+                  context={
+                      'order_items': order_items,
+                      'filter_form': filter_form,
+                      'claim_form': ClaimOrdersForm(),
+                      'next_page_query': next_page_query,
+                      'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+                  })
+
+
+@require_POST
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def claim_orders_view(request):
+    claim_form = ClaimOrdersForm(request.POST)
+    if claim_form.is_valid():
+        claim_orders(request.user, claim_form.cleaned_data['count'])
+    return redirect(f"{reverse('restaurateur:view_orders')}?mine=on")
+
+
+@require_POST
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def release_orders_view(request):
+    release_orders(request.user)
+    return redirect('restaurateur:view_orders')
 
 
@@ -0,0 +1,109 @@
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import OperationalError
+
+from star_burger.metrics import register_collector
+
+from .pool import ConnectionPool, PoolTimeout
+
+
+POOL_METRICS = [
+    ('django_db_connections_open', 'gauge',
+     'Открытые соединения с базой', 'open'),
+    ('django_db_connections_idle', 'gauge',
+     'Свободные соединения в пуле', 'idle'),
+    ('django_db_connections_in_use', 'gauge',
+     'Соединения, занятые потоками', 'in_use'),
+    ('django_db_connections_waiting', 'gauge',
+     'Потоки, ждущие свободного соединения', 'waiting'),
+    ('django_db_connects_total', 'counter',
+     'Новые соединения с базой', 'connects'),
+    ('django_db_connect_seconds_total', 'counter',
+     'Время установки новых соединений', 'connect_time'),
+    ('django_db_checkouts_total', 'counter',
+     'Выдачи соединений потокам', 'checkouts'),
+    ('django_db_checkout_wait_seconds_total', 'counter',
+     'Время ожидания свободного соединения', 'wait_time'),
+    ('django_db_pool_timeouts_total', 'counter',
+     'Потоки, не дождавшиеся свободного соединения', 'timeouts'),
+]
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    # Тестовый прогон меняет NAME у того же alias, старые соединения
+    # ему не подходят
+    key = (alias, settings_dict['NAME'])
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                max_size=settings_dict.get('POOL_SIZE') or None,
+                timeout=settings_dict.get('POOL_TIMEOUT', 10),
+                max_age=settings_dict.get('POOL_MAX_AGE'),
+                health_checks=settings_dict.get('HEALTH_CHECKS', True),
+            )
+        return _pools[key]
+
+
+@register_collector
+def collect_pool_stats():
+    with _pools_lock:
+        pools = list(_pools.items())
+    samples = []
+    for (alias, _), pool in pools:
+        stats = pool.stats()
+        for metric, metric_type, description, key in POOL_METRICS:
+            samples.append(
+                (metric, metric_type, description, {'alias': alias}, stats[key])
+            )
+    return samples
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с общим пулом соединений и проверкой соединения перед
+    повторным использованием."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        def connect():
+            return super(DatabaseWrapper, self).get_new_connection(conn_params)
+
+        try:
+            connection = self.pool.getconn(connect)
+        except PoolTimeout as error:
+            raise OperationalError(str(error)) from error
+
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level',
+                                           connection.isolation_level)
+        self.health_check_done = True
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            # Соединение, закрытое посреди транзакции, ещё числится за этим
+            # потоком, поэтому отдавать его другим нельзя
+            self.pool.putconn(self.connection, discard=self.in_atomic_block)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (self.connection is not None and not self.health_check_done
+                and not self.in_atomic_block):
+            self.health_check_done = True
+            if (self.settings_dict.get('HEALTH_CHECKS', True)
+                    and not self.is_usable()):
+                self.close()
+        super().ensure_connection()
@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import deque
+
+from psycopg2 import Error as DatabaseError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Соединения с базой, общие для всех потоков процесса.
+
+    Без max_size пул не ограничивает число соединений и не хранит
+    свободные, а только считает статистику: так работает режим без пула.
+    С health_checks каждое выданное из пула соединение сначала
+    проверяется запросом SELECT 1 — это лишний поход в базу на выдачу.
+    """
+
+    def __init__(self, max_size=None, timeout=10, max_age=None,
+                 health_checks=True):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.health_checks = health_checks
+        self.condition = threading.Condition()
+        self.idle = deque()
+        self.connected_at = {}
+        self.connecting = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.connects = 0
+        self.connect_time = 0
+        self.checkouts = 0
+        self.wait_time = 0
+        self.timeouts = 0
+
+    @property
+    def size(self):
+        return len(self.connected_at) + self.connecting
+
+    def getconn(self, connect):
+        while True:
+            connection = self._checkout()
+            if connection is None:
+                return self._connect(connect)
+            if self._is_usable(connection):
+                return connection
+            self._discard(connection)
+
+    def putconn(self, connection, discard=False):
+        if discard or not self.max_size or not self._rollback(connection):
+            self._discard(connection)
+            return
+        with self.condition:
+            self.in_use -= 1
+            self.idle.append(connection)
+            self.condition.notify()
+
+    def _checkout(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self.condition:
+            while self.max_size and not self.idle and self.size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        f'Все {self.max_size} соединений с базой заняты '
+                        f'дольше {self.timeout} с'
+                    )
+                self.waiting += 1
+                try:
+                    self.condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.checkouts += 1
+            self.wait_time += time.monotonic() - started
+            self.in_use += 1
+            if self.idle:
+                # LIFO: чаще переиспользуются одни и те же соединения,
+                # а лишние дольше простаивают и закрываются по max_age
+                return self.idle.pop()
+            self.connecting += 1
+            return None
+
+    def _connect(self, connect):
+        started = time.monotonic()
+        try:
+            connection = connect()
+        except BaseException:
+            with self.condition:
+                self.connecting -= 1
+                self.in_use -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.connecting -= 1
+            self.connected_at[connection] = time.monotonic()
+            self.connects += 1
+            self.connect_time += time.monotonic() - started
+        return connection
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except DatabaseError:
+            pass
+        with self.condition:
+            self.connected_at.pop(connection, None)
+            self.in_use -= 1
+            self.condition.notify()
+
+    def _is_expired(self, connection):
+        if self.max_age is None:
+            return False
+        return time.monotonic() - self.connected_at[connection] > self.max_age
+
+    def _is_usable(self, connection):
+        if connection.closed or self._is_expired(connection):
+            return False
+        if not self.health_checks:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except DatabaseError:
+            return False
+        return True
+
+    def _rollback(self, connection):
+        if connection.closed:
+            return False
+        try:
+            if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except DatabaseError:
+            return False
+        return True
+
+    def stats(self):
+        with self.condition:
+            return {
+                'open': self.size,
+                'idle': len(self.idle),
+                'in_use': self.in_use,
+                'waiting': self.waiting,
+                'connects': self.connects,
+                'connect_time': self.connect_time,
+                'checkouts': self.checkouts,
+                'wait_time': self.wait_time,
+                'timeouts': self.timeouts,
+            }
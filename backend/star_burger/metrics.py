@@ -0,0 +1,331 @@
+import asyncio
+import glob
+import json
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+HISTOGRAMS = {
+    'django_view_latency_seconds': (
+        'Время обработки запроса', LATENCY_BUCKETS,
+    ),
+    'django_view_db_queries': (
+        'Количество SQL-запросов за один запрос к сайту', QUERY_COUNT_BUCKETS,
+    ),
+    'django_view_db_time_seconds': (
+        'Время SQL-запросов за один запрос к сайту', LATENCY_BUCKETS,
+    ),
+}
+
+_collectors = []
+
+
+def register_collector(collector):
+    """Добавляет в /metrics значения, которые вернёт collector().
+
+    collector() возвращает список (метрика, тип, описание, метки, значение).
+    Каждый воркер сохраняет значения вместе с гистограммами, а /metrics
+    складывает их по всем живым воркерам.
+    """
+    _collectors.append(collector)
+    return collector
+
+
+def collect_samples():
+    samples = []
+    for collector in _collectors:
+        for metric, metric_type, description, labels, value in collector():
+            samples.append([metric, metric_type, description, labels, value])
+    return samples
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def dump(self):
+        return {'counts': self.counts, 'sum': self.sum}
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.flushed_at = 0
+
+    def observe(self, view, method, latency, queries, db_time):
+        values = {
+            'django_view_latency_seconds': latency,
+            'django_view_db_queries': queries,
+            'django_view_db_time_seconds': db_time,
+        }
+        with self.lock:
+            for metric, value in values.items():
+                key = (metric, view, method)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(HISTOGRAMS[metric][1])
+                self.histograms[key].observe(value)
+
+    def is_flush_due(self):
+        return time.monotonic() - self.flushed_at >= settings.METRICS_FLUSH_INTERVAL
+
+    def flush(self, force=False):
+        with self.lock:
+            if not force and not self.is_flush_due():
+                return
+            histograms = [
+                [metric, view, method, histogram.dump()]
+                for (metric, view, method), histogram in self.histograms.items()
+            ]
+            self.flushed_at = time.monotonic()
+        snapshot = {'histograms': histograms, 'samples': collect_samples()}
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = os.path.join(settings.METRICS_DIR, f'metrics-{os.getpid()}.json')
+        # Воркер может сбрасывать метрики из нескольких потоков сразу
+        temporary_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(snapshot, file)
+        os.replace(temporary_path, path)
+
+
+registry = Registry()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.time = 0
+
+
+# Счётчик текущего запроса. Контекст копируется в потоки sync_to_async,
+# поэтому асинхронные view тоже считают свои SQL-запросы
+_query_counter = ContextVar('query_counter', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    query_counter = _query_counter.get()
+    if query_counter is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        query_counter.time += time.perf_counter() - started
+        query_counter.count += 1
+
+
+def install_query_counter(sender, connection, **kwargs):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+def get_view_name(request):
+    resolver_match = getattr(request, 'resolver_match', None)
+    if resolver_match is None:
+        return '<unresolved>'
+    return resolver_match.url_name or resolver_match.view_name
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # Синхронный middleware заставил бы Django выполнять асинхронные
+        # view по одному в общем потоке
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        connection_created.connect(install_query_counter,
+                                   dispatch_uid='metrics_query_counter')
+        for connection in connections.all():
+            if connection.connection is not None:
+                install_query_counter(None, connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            response = self.get_response(request)
+            registry.flush()
+            return response
+
+        query_counter = QueryCounter()
+        token = _query_counter.set(query_counter)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _query_counter.reset(token)
+        self.observe(request, time.perf_counter() - started, query_counter)
+        registry.flush()
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            response = await self.get_response(request)
+            await self.flush_async()
+            return response
+
+        query_counter = QueryCounter()
+        token = _query_counter.set(query_counter)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_counter.reset(token)
+        self.observe(request, time.perf_counter() - started, query_counter)
+        await self.flush_async()
+        return response
+
+    async def flush_async(self):
+        # Запись файла не должна останавливать цикл событий
+        if registry.is_flush_due():
+            await sync_to_async(registry.flush, thread_sensitive=False)()
+
+    def observe(self, request, latency, query_counter):
+        registry.observe(get_view_name(request), request.method, latency,
+                         query_counter.count, query_counter.time)
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def load_snapshots():
+    """Перебирает снимки метрик живых воркеров.
+
+    Файлы завершившихся воркеров удаляются, иначе после каждого
+    перезапуска их счётчики так и складывались бы с новыми. Prometheus
+    видит это как обычный сброс счётчика.
+    """
+    pattern = os.path.join(settings.METRICS_DIR, 'metrics-*.json')
+    for path in glob.glob(pattern):
+        pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+        if not is_alive(pid):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        try:
+            with open(path) as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            continue
+        yield snapshot
+
+
+def merge_snapshots(snapshots):
+    histograms = {}
+    samples = {}
+    for snapshot in snapshots:
+        for metric, view, method, dump in snapshot['histograms']:
+            if metric not in HISTOGRAMS:
+                continue
+            key = (metric, view, method)
+            if key not in histograms:
+                histograms[key] = Histogram(HISTOGRAMS[metric][1])
+            histogram = histograms[key]
+            histogram.counts = [
+                total + count for total, count in zip(histogram.counts, dump['counts'])
+            ]
+            histogram.sum += dump['sum']
+
+        for metric, metric_type, description, labels, value in snapshot['samples']:
+            key = (metric, tuple(sorted(labels.items())))
+            if key not in samples:
+                samples[key] = [metric_type, description, 0]
+            samples[key][2] += value
+    return histograms, samples
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    return ','.join(
+        f'{name}="{escape_label(str(value))}"' for name, value in labels
+    )
+
+
+def format_histograms(histograms):
+    lines = []
+    for metric, (description, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} histogram')
+        for (name, view, method), histogram in sorted(histograms.items()):
+            if name != metric:
+                continue
+            labels = f'view="{escape_label(view)}",method="{escape_label(method)}"'
+            cumulative = 0
+            for bucket, count in zip(buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{labels},le="{bucket}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{{labels}}} {histogram.sum}')
+            lines.append(f'{metric}_count{{{labels}}} {cumulative}')
+    return lines
+
+
+def format_samples(samples):
+    lines = []
+    described = set()
+    for (metric, labels), (metric_type, description, value) in sorted(samples.items()):
+        if metric not in described:
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} {metric_type}')
+            described.add(metric)
+        lines.append(f'{metric}{{{format_labels(labels)}}} {value}')
+    return lines
+
+
+def is_metrics_allowed(request):
+    if request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS:
+        return True
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and constant_time_compare(authorization,
+                                                 f'Bearer {token}')
+
+
+def metrics_view(request):
+    # Порт 8000 опубликован наружу мимо nginx, поэтому view проверяет доступ сам
+    if not is_metrics_allowed(request):
+        return HttpResponseForbidden()
+    registry.flush(force=True)
+    histograms, samples = merge_snapshots(load_snapshots())
+    lines = format_histograms(histograms) + format_samples(samples)
+    return HttpResponse('\n'.join(lines) + '\n',
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,4 +1,6 @@
 import os
+import tempfile
+from datetime import timedelta
 
 import rollbar
 
@@ -12,6 +14,32 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 GEO_APIKEY = env('GEO_APIKEY')
+GEOCODER = env('GEOCODER', 'place.geocoders.YandexGeocoder')
+GEOCODER_TIMEOUT = env.float('GEOCODER_TIMEOUT', 10)
+GEOCODER_CONCURRENCY = env.int('GEOCODER_CONCURRENCY', 10)
+GEOCODER_BATCH_SIZE = env.int('GEOCODER_BATCH_SIZE', 50)
+GEOCODER_MAX_ATTEMPTS = env.int('GEOCODER_MAX_ATTEMPTS', 8)
+GEOCODER_RETRY_DELAY = timedelta(
+    seconds=env.int('GEOCODER_RETRY_DELAY_SECONDS', 30))
+GEOCODER_MAX_RETRY_DELAY = timedelta(
+    seconds=env.int('GEOCODER_MAX_RETRY_DELAY_SECONDS', 60 * 60))
+GEOCODER_CACHE_TTL = timedelta(days=env.int('GEOCODER_CACHE_TTL_DAYS', 90))
+GEOCODER_NEGATIVE_CACHE_TTL = timedelta(
+    hours=env.int('GEOCODER_NEGATIVE_CACHE_TTL_HOURS', 24))
+DISTANCE_METHOD = env('DISTANCE_METHOD', 'haversine')
+NEAREST_RESTAURANTS_LIMIT = env.int('NEAREST_RESTAURANTS_LIMIT', 10)
+ORDER_BATCH_MAX_SIZE = env.int('ORDER_BATCH_MAX_SIZE', 500)
+ORDERS_PAGE_SIZE = env.int('ORDERS_PAGE_SIZE', 50)
+PRODUCT_SEARCH_MAX_LIMIT = env.int('PRODUCT_SEARCH_MAX_LIMIT', 20)
+IDEMPOTENCY_KEY_TTL = timedelta(
+    hours=env.int('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+ORDER_CLAIM_TIMEOUT = timedelta(
+    minutes=env.int('ORDER_CLAIM_TIMEOUT_MINUTES', 15))
+DISPATCH_BATCH_SIZE = env.int('DISPATCH_BATCH_SIZE', 200)
+DISPATCH_CANDIDATES = env.int('DISPATCH_CANDIDATES', 10)
+DISPATCH_LOAD_PENALTY_KM = env.float('DISPATCH_LOAD_PENALTY_KM', 1.0)
+DISPATCH_LOAD_WINDOW = timedelta(
+    hours=env.int('DISPATCH_LOAD_WINDOW_HOURS', 3))
 SECRET_KEY = env('SECRET_KEY', 'etirgvonenrfniuythjkrenogneongg334g')
 DEBUG = env.bool('DEBUG', 'True')
 ROLLBAR_TOKEN = env('ROLLBAR_TOKEN')
@@ -27,13 +55,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'debug_toolbar',
     'phonenumber_field',
     'rest_framework',
     'place',
 ]
 
 MIDDLEWARE = [
+    'star_burger.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -41,11 +69,17 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 
     'rollbar.contrib.django.middleware.RollbarNotifierMiddlewareExcluding404',
 ]
 
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.middleware.clickjacking.XFrameOptionsMiddleware') + 1,
+        'debug_toolbar.middleware.DebugToolbarMiddleware',
+    )
+
 ROOT_URLCONF = 'star_burger.urls'
 
 DEBUG_TOOLBAR_PANELS = [
@@ -82,14 +116,53 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'star_burger.wsgi.application'
+ASGI_APPLICATION = 'star_burger.asgi.application'
+ASYNC_API = env.bool('ASYNC_API', False)
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+DB_POOL_SIZE = env.int('DB_POOL_SIZE', 0)
+DB_CONN_MAX_AGE = env.int('DB_CONN_MAX_AGE', 60)
+
+# С пулом поток возвращает соединение в пул после каждого запроса,
+# а сколько жить соединению, решает уже пул
 DATABASES = {
-    'default': env.dj_db_url("POSTGRES_DB_URL")
+    'default': env.dj_db_url(
+        "POSTGRES_DB_URL", conn_max_age=0 if DB_POOL_SIZE else DB_CONN_MAX_AGE
+    )
+}
+if 'postgresql' in DATABASES['default']['ENGINE']:
+    DATABASES['default'].update({
+        'ENGINE': 'star_burger.db',
+        'HEALTH_CHECKS': env.bool('DB_HEALTH_CHECKS', True),
+        'POOL_SIZE': DB_POOL_SIZE,
+        'POOL_TIMEOUT': env.float('DB_POOL_TIMEOUT', 10),
+        'POOL_MAX_AGE': DB_CONN_MAX_AGE,
+    })
+
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND',
+                       'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': env('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': env.int('CACHE_MAX_ENTRIES', 10000),
+        },
+    }
 }
 
+FRAGMENT_CACHE_TIMEOUT = env.int('FRAGMENT_CACHE_TIMEOUT', 24 * 60 * 60)
+
+METRICS_ENABLED = env.bool('METRICS_ENABLED', True)
+METRICS_SAMPLE_RATE = env.float('METRICS_SAMPLE_RATE', 1.0)
+METRICS_FLUSH_INTERVAL = env.float('METRICS_FLUSH_INTERVAL', 10)
+METRICS_DIR = env('METRICS_DIR', os.path.join(tempfile.gettempdir(),
+                                              'star_burger_metrics'))
+METRICS_TOKEN = env('METRICS_TOKEN', '')
+
+CATALOG_CACHE_TIMEOUT = env.int('CATALOG_CACHE_TIMEOUT', 24 * 60 * 60)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -116,6 +189,7 @@ USE_L10N = True
 USE_TZ = True
 
 STATIC_URL = '/static/'
+STATICFILES_STORAGE = 'star_burger.storage.CompressedManifestStaticFilesStorage'
 
 INTERNAL_IPS = [
     '127.0.0.1'
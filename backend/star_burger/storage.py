@@ -0,0 +1,63 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico',
+    '.ttf', '.otf', '.eot',
+}
+MIN_COMPRESSIBLE_SIZE = 256
+
+
+def compress_gzip(content):
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def compress_brotli(content):
+    return brotli.compress(content, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хешем содержимого в имени и готовыми .gz рядом.
+
+    nginx отдаёт сжатые копии сам (gzip_static), не сжимая файлы
+    на каждый запрос. Копии .br не создаются: в образе nginx нет
+    модуля ngx_brotli, и отдавать их было бы некому.
+    """
+
+    compressors = [('gz', compress_gzip)]
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Промежуточные версии CSS к этому моменту уже удалены, в
+        # hashed_files остаются только итоговые имена
+        for name in sorted(set(paths) | set(self.hashed_files.values())):
+            self.compress(name)
+
+    def compress(self, name):
+        _, extension = os.path.splitext(name)
+        if extension.lower() not in COMPRESSIBLE_EXTENSIONS:
+            return
+        with self.open(name) as file:
+            content = file.read()
+        if len(content) < MIN_COMPRESSIBLE_SIZE:
+            return
+
+        for suffix, compress in self.compressors:
+            compressed = compress(content)
+            if len(compressed) >= len(content):
+                continue
+            compressed_name = f'{name}.{suffix}'
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            self._save(compressed_name, ContentFile(compressed))
@@ -0,0 +1,471 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test import override_settings
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.extensions import TRANSACTION_STATUS_INERROR
+from psycopg2.extensions import TRANSACTION_STATUS_INTRANS
+
+from . import metrics
+from .db.pool import ConnectionPool, PoolTimeout
+from .storage import CompressedManifestStaticFilesStorage
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.transaction_status = TRANSACTION_STATUS_IDLE
+        self.executed = []
+        self.rollbacks = 0
+
+    @contextmanager
+    def cursor(self):
+        yield self
+
+    def execute(self, sql):
+        if self.broken:
+            raise OperationalError('server closed the connection')
+        self.executed.append(sql)
+
+    def get_transaction_status(self):
+        return self.transaction_status
+
+    def rollback(self):
+        if self.broken:
+            raise OperationalError('server closed the connection')
+        self.rollbacks += 1
+        self.transaction_status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        self.connections = []
+
+    def connect(self):
+        connection = FakeConnection()
+        self.connections.append(connection)
+        return connection
+
+    def test_returned_connection_is_reused(self):
+        pool = ConnectionPool(max_size=2)
+
+        connection = pool.getconn(self.connect)
+        pool.putconn(connection)
+
+        self.assertIs(pool.getconn(self.connect), connection)
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(connection.executed, ['SELECT 1'])
+
+    def test_last_returned_connection_is_reused_first(self):
+        pool = ConnectionPool(max_size=2)
+        first_connection = pool.getconn(self.connect)
+        second_connection = pool.getconn(self.connect)
+
+        pool.putconn(first_connection)
+        pool.putconn(second_connection)
+
+        self.assertIs(pool.getconn(self.connect), second_connection)
+        self.assertIs(pool.getconn(self.connect), first_connection)
+
+    def test_exhausted_pool_times_out(self):
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+        pool.getconn(self.connect)
+
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(self.connect)
+
+        self.assertEqual(pool.stats()['timeouts'], 1)
+        self.assertEqual(len(self.connections), 1)
+
+    def test_waiting_thread_gets_returned_connection(self):
+        pool = ConnectionPool(max_size=1, timeout=5)
+        connection = pool.getconn(self.connect)
+        received = []
+        waiter = threading.Thread(
+            target=lambda: received.append(pool.getconn(self.connect))
+        )
+
+        waiter.start()
+        while not pool.stats()['waiting']:
+            waiter.join(0.001)
+        pool.putconn(connection)
+        waiter.join()
+
+        self.assertEqual(received, [connection])
+
+    def test_broken_connection_is_replaced(self):
+        pool = ConnectionPool(max_size=2)
+        connection = pool.getconn(self.connect)
+        pool.putconn(connection)
+        connection.broken = True
+
+        new_connection = pool.getconn(self.connect)
+
+        self.assertIsNot(new_connection, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['open'], 1)
+
+    def test_connection_left_in_transaction_is_rolled_back(self):
+        pool = ConnectionPool(max_size=2)
+        connection = pool.getconn(self.connect)
+        connection.transaction_status = TRANSACTION_STATUS_INTRANS
+
+        pool.putconn(connection)
+
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertIs(pool.getconn(self.connect), connection)
+
+    def test_connection_failing_rollback_is_discarded(self):
+        pool = ConnectionPool(max_size=2)
+        connection = pool.getconn(self.connect)
+        connection.transaction_status = TRANSACTION_STATUS_INERROR
+        connection.broken = True
+
+        pool.putconn(connection)
+
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['open'], 0)
+        self.assertIsNot(pool.getconn(self.connect), connection)
+
+    def test_connection_can_be_discarded_explicitly(self):
+        pool = ConnectionPool(max_size=2)
+        connection = pool.getconn(self.connect)
+
+        pool.putconn(connection, discard=True)
+
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['idle'], 0)
+
+    def test_old_connection_is_recycled(self):
+        pool = ConnectionPool(max_size=2, max_age=60)
+        connection = pool.getconn(self.connect)
+        pool.putconn(connection)
+        pool.connected_at[connection] -= 61
+
+        new_connection = pool.getconn(self.connect)
+
+        self.assertIsNot(new_connection, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(connection.executed, [])
+
+    def test_health_checks_can_be_disabled(self):
+        pool = ConnectionPool(max_size=2, health_checks=False)
+        connection = pool.getconn(self.connect)
+        pool.putconn(connection)
+
+        pool.getconn(self.connect)
+
+        self.assertEqual(connection.executed, [])
+
+    def test_without_size_connections_are_not_kept(self):
+        pool = ConnectionPool()
+        connection = pool.getconn(self.connect)
+
+        pool.putconn(connection)
+
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.getconn(self.connect), connection)
+
+    def test_stats(self):
+        pool = ConnectionPool(max_size=3)
+        first_connection = pool.getconn(self.connect)
+        pool.getconn(self.connect)
+        pool.putconn(first_connection)
+        pool.getconn(self.connect)
+
+        stats = pool.stats()
+
+        self.assertEqual(
+            {key: stats[key] for key in
+             ['open', 'idle', 'in_use', 'waiting', 'connects', 'checkouts',
+              'timeouts']},
+            {'open': 2, 'idle': 0, 'in_use': 2, 'waiting': 0, 'connects': 2,
+             'checkouts': 3, 'timeouts': 0},
+        )
+        self.assertGreaterEqual(stats['connect_time'], 0)
+        self.assertGreaterEqual(stats['wait_time'], 0)
+
+    def test_failed_connect_frees_the_slot(self):
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+
+        def fail():
+            raise OperationalError('connection refused')
+
+        with self.assertRaises(OperationalError):
+            pool.getconn(fail)
+
+        self.assertEqual(pool.stats()['open'], 0)
+        self.assertIsNotNone(pool.getconn(self.connect))
+
+
+def get_observations(registry, metric):
+    return {
+        (view, method): histogram
+        for (name, view, method), histogram in registry.histograms.items()
+        if name == metric
+    }
+
+
+class MergeSnapshotsTest(SimpleTestCase):
+    def make_snapshot(self, latency, connects, open_connections):
+        registry = metrics.Registry()
+        registry.observe('products', 'GET', latency, 2, 0.001)
+        histograms = [
+            [metric, view, method, histogram.dump()]
+            for (metric, view, method), histogram in registry.histograms.items()
+        ]
+        samples = [
+            ['django_db_connects_total', 'counter', '', {'alias': 'default'},
+             connects],
+            ['django_db_connections_open', 'gauge', '', {'alias': 'default'},
+             open_connections],
+        ]
+        return {'histograms': histograms, 'samples': samples}
+
+    def test_histograms_and_samples_are_summed(self):
+        histograms, samples = metrics.merge_snapshots([
+            self.make_snapshot(0.003, connects=5, open_connections=2),
+            self.make_snapshot(0.2, connects=7, open_connections=1),
+        ])
+
+        latency = histograms[('django_view_latency_seconds', 'products', 'GET')]
+        self.assertEqual(sum(latency.counts), 2)
+        self.assertAlmostEqual(latency.sum, 0.203)
+        self.assertEqual(latency.counts[0], 1)
+        self.assertEqual(
+            latency.counts[metrics.LATENCY_BUCKETS.index(0.25)], 1
+        )
+        labels = (('alias', 'default'),)
+        self.assertEqual(samples[('django_db_connects_total', labels)][2], 12)
+        self.assertEqual(samples[('django_db_connections_open', labels)][2], 3)
+
+    def test_histogram_is_cumulative_in_output(self):
+        histograms, _ = metrics.merge_snapshots([
+            self.make_snapshot(0.003, connects=0, open_connections=0),
+            self.make_snapshot(0.2, connects=0, open_connections=0),
+        ])
+
+        lines = metrics.format_histograms(histograms)
+
+        self.assertIn('django_view_latency_seconds_bucket'
+                      '{view="products",method="GET",le="0.005"} 1', lines)
+        self.assertIn('django_view_latency_seconds_bucket'
+                      '{view="products",method="GET",le="+Inf"} 2', lines)
+        self.assertIn('django_view_latency_seconds_count'
+                      '{view="products",method="GET"} 2', lines)
+
+
+def use_temporary_metrics_dir(test_case):
+    metrics_dir = tempfile.mkdtemp()
+    test_case.addCleanup(shutil.rmtree, metrics_dir)
+    metrics_settings = test_case.settings(METRICS_DIR=metrics_dir)
+    metrics_settings.enable()
+    test_case.addCleanup(metrics_settings.disable)
+    return metrics_dir
+
+
+class MetricsFilesTest(SimpleTestCase):
+    def setUp(self):
+        self.metrics_dir = use_temporary_metrics_dir(self)
+
+    def write_snapshot(self, pid):
+        path = os.path.join(self.metrics_dir, f'metrics-{pid}.json')
+        with open(path, 'w') as file:
+            json.dump({'histograms': [], 'samples': []}, file)
+        return path
+
+    def test_dead_worker_files_are_pruned(self):
+        finished = subprocess.run(
+            [sys.executable, '-c', 'import os; print(os.getpid())'],
+            capture_output=True, check=True,
+        )
+        dead_path = self.write_snapshot(int(finished.stdout))
+        live_path = self.write_snapshot(os.getpid())
+
+        snapshots = list(metrics.load_snapshots())
+
+        self.assertEqual(len(snapshots), 1)
+        self.assertFalse(os.path.exists(dead_path))
+        self.assertTrue(os.path.exists(live_path))
+
+    def test_flush_writes_worker_snapshot(self):
+        registry = metrics.Registry()
+        registry.observe('products', 'GET', 0.01, 1, 0.001)
+
+        registry.flush(force=True)
+
+        self.assertEqual(os.listdir(self.metrics_dir),
+                         [f'metrics-{os.getpid()}.json'])
+        self.assertFalse(registry.is_flush_due())
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_SAMPLE_RATE=1.0)
+class MetricsMiddlewareTest(TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+        self.flush = mock.patch.object(self.registry, 'flush').start()
+        mock.patch.object(metrics, 'registry', self.registry).start()
+        self.addCleanup(mock.patch.stopall)
+        self.request = RequestFactory().get('/')
+
+    def get_query_counts(self):
+        histogram = get_observations(self.registry, 'django_view_db_queries')
+        counts = histogram[('<unresolved>', 'GET')].counts
+        return {
+            bucket: count
+            for bucket, count in zip(metrics.QUERY_COUNT_BUCKETS, counts) if count
+        }
+
+    def test_queries_are_counted(self):
+        def view(request):
+            list(get_user_model().objects.all())
+            list(get_user_model().objects.all())
+            return HttpResponse()
+
+        metrics.MetricsMiddleware(view)(self.request)
+
+        self.assertEqual(self.get_query_counts(), {2: 1})
+        self.flush.assert_called_once_with()
+
+    def test_queries_in_sync_to_async_are_counted(self):
+        async def view(request):
+            await sync_to_async(lambda: list(get_user_model().objects.all()))()
+            return HttpResponse()
+
+        middleware = metrics.MetricsMiddleware(view)
+        async_to_sync(middleware)(self.request)
+
+        self.assertEqual(self.get_query_counts(), {1: 1})
+
+    def test_async_flush_runs_outside_event_loop(self):
+        flush_threads = []
+        self.flush.side_effect = lambda: flush_threads.append(
+            threading.get_ident()
+        )
+
+        async def view(request):
+            view.thread = threading.get_ident()
+            return HttpResponse()
+
+        async_to_sync(metrics.MetricsMiddleware(view))(self.request)
+
+        self.assertEqual(len(flush_threads), 1)
+        self.assertNotEqual(flush_threads[0], view.thread)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_observed(self):
+        metrics.MetricsMiddleware(lambda request: HttpResponse())(self.request)
+
+        self.assertEqual(self.registry.histograms, {})
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsViewTest(TestCase):
+    def setUp(self):
+        use_temporary_metrics_dir(self)
+
+    def get(self, **headers):
+        return self.client.get('/metrics/', **headers)
+
+    def test_internal_ips_are_allowed(self):
+        response = self.get(REMOTE_ADDR='127.0.0.1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE django_view_latency_seconds histogram',
+                      response.content.decode())
+
+    def test_outside_requests_need_token(self):
+        self.assertEqual(self.get(REMOTE_ADDR='10.0.0.5').status_code, 403)
+        self.assertEqual(
+            self.get(REMOTE_ADDR='10.0.0.5',
+                     HTTP_AUTHORIZATION='Bearer wrong').status_code,
+            403,
+        )
+        self.assertEqual(
+            self.get(REMOTE_ADDR='10.0.0.5',
+                     HTTP_AUTHORIZATION='Bearer secret').status_code,
+            200,
+        )
+
+    @override_settings(METRICS_TOKEN='')
+    def test_empty_token_allows_nobody_outside(self):
+        response = self.get(REMOTE_ADDR='10.0.0.5', HTTP_AUTHORIZATION='Bearer ')
+
+        self.assertEqual(response.status_code, 403)
+
+
+NGINX_CONF = os.path.join(settings.BASE_DIR, '..', 'nginx', 'nginx.conf')
+
+
+class CompressedStaticFilesTest(SimpleTestCase):
+    def setUp(self):
+        source_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source_dir)
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+        with open(os.path.join(source_dir, 'site.css'), 'w') as file:
+            file.write('body { color: black; }\n' * 100)
+        with open(os.path.join(source_dir, 'tiny.js'), 'w') as file:
+            file.write('1;')
+        static_settings = self.settings(
+            STATICFILES_DIRS=[source_dir], STATIC_ROOT=self.static_root,
+            INSTALLED_APPS=['django.contrib.staticfiles'],
+        )
+        static_settings.enable()
+        self.addCleanup(static_settings.disable)
+
+    def test_only_gzip_copies_are_written(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+        names = os.listdir(self.static_root)
+        hashed_css = next(name for name in names
+                          if re.fullmatch(r'site\.[0-9a-f]{12}\.css', name))
+        self.assertIn(f'{hashed_css}.gz', names)
+        self.assertFalse(any(name.endswith('.br') for name in names))
+        self.assertFalse(any(name.startswith('tiny') and name.endswith('.gz')
+                             for name in names))
+
+
+@skipUnless(os.path.exists(NGINX_CONF), 'nginx.conf лежит вне каталога backend')
+class NginxImmutableStaticTest(SimpleTestCase):
+    def get_immutable_pattern(self):
+        with open(NGINX_CONF) as file:
+            pattern = re.search(r'location ~ "([^"]+)"', file.read()).group(1)
+        return re.compile(pattern)
+
+    def test_only_hashed_names_are_immutable(self):
+        pattern = self.get_immutable_pattern()
+        storage = CompressedManifestStaticFilesStorage()
+        hashed_names = [
+            storage.hashed_name(name, content=ContentFile(b'content'))
+            for name in ['index.js', 'bundles/index.js', 'css/site.min.css',
+                         'admin/img/icon.svg']
+        ]
+
+        for name in hashed_names:
+            with self.subTest(name=name):
+                self.assertTrue(pattern.search(f'/static/{name}'))
+        for name in ['index.js', 'admin/css/base.css', 'bundles/index.js.map',
+                     'logo.0123456789ab/icon.png', 'burger.jpg']:
+            with self.subTest(name=name):
+                self.assertFalse(pattern.search(f'/static/{name}'))
@@ -20,6 +20,7 @@ from django.urls import path, include
 from django.shortcuts import render
 
 from . import settings
+from .metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -29,6 +30,11 @@ urlpatterns = [
     path('api-auth/', include('rest_framework.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
+if settings.METRICS_ENABLED:
+    urlpatterns += [
+        path('metrics/', metrics_view, name='metrics'),
+    ]
+
 if settings.DEBUG:
     import debug_toolbar
     urlpatterns = [
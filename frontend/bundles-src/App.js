@@ -62,6 +62,16 @@ class App extends Component {
 
     let csrfToken = document.querySelector("[name=csrfmiddlewaretoken]").value;
 
+    let body = JSON.stringify(data);
+    // Повтор того же заказа после сетевой ошибки идёт с тем же ключом,
+    // и сервер не создаст заказ второй раз
+    if (!this.pendingOrder || this.pendingOrder.body !== body){
+      this.pendingOrder = {
+        body,
+        idempotencyKey: Date.now().toString(36) + Math.random().toString(36).slice(2),
+      };
+    }
+
     try {
       let response = await fetch(url, {
         method: 'post',
@@ -69,8 +79,9 @@ class App extends Component {
           'Accept': 'application/json',
           'Content-Type': 'application/json',
           'X-CSRFToken': csrfToken,
+          'Idempotency-Key': this.pendingOrder.idempotencyKey,
         },
-        body: JSON.stringify(data),
+        body,
       });
 
       if (!response.ok){
@@ -78,6 +89,7 @@ class App extends Component {
         return;
       }
       let responseData = await response.json();
+      this.pendingOrder = null;
 
       this.setState({
         cart: [],